@@ -5,13 +5,71 @@ from typing import List
 import uuid
 import random
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from mcp_client.main import MCPClient
 from mcp_client.core.chat_orchestrator import ChatOrchestrator
+from mcp_client.core.federation import MCPFederation
+from mcp_client.core.stream_writer import StreamWriter
+from mcp_client.core.conversation_store import ConversationStore
+from mcp_client.core.blob_store import blob_store
+from mcp_client.core.stream_log import StreamChannel, StreamRegistry
+from mcp_client.core.usage import UsageTracker
+from mcp_client.rag.retrieve_tools import query_batcher, query_cache
+from mcp_client.config.settings import settings, load_mcp_servers
+from mcp_client.utils.serializer import EventSerializer
+
+MCP_SERVER_URL = "http://127.0.0.1:8001/mcp/"
+
+# open connections, used to report per-client outbound queue metrics
+active_connections: set["ConnectionManager"] = set()
+
+def configured_mcp_servers() -> dict:
+    """servers from the mcpServers config, or the local server when there is none."""
+    try:
+        servers = load_mcp_servers(settings.mcp_servers_config).get("mcpServers", {})
+    except FileNotFoundError:
+        servers = {}
+    return servers or {"axon": {"url": MCP_SERVER_URL}}
+
+# MCP sessions of every configured server, shared by every websocket connection
+session_pool = MCPFederation(
+    configured_mcp_servers(),
+    size=settings.mcp_pool_size,
+    health_check_interval=settings.mcp_pool_health_check_interval,
+    connect_timeout=settings.mcp_connect_timeout,
+    list_timeout=settings.mcp_list_tools_timeout,
+    catalog_path=settings.mcp_catalog_cache_path,
+)
+
+# chat histories shared by every connection, so a reconnect can pick a chat up again
+conversation_store = ConversationStore(
+    settings.conversation_db_path,
+    window_size=settings.conversation_window_size,
+    max_chats=settings.conversation_cache_chats,
+)
+
+# replay buffers of recent assistant messages, so a reconnecting client can resume a stream
+stream_registry = StreamRegistry(
+    max_messages=settings.stream_replay_messages,
+    max_events=settings.stream_replay_events,
+)
+
+# llm token usage of every turn, to follow the prompt cache hit rate
+usage_tracker = UsageTracker()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await session_pool.start(warm=1)
+    yield
+    await session_pool.close()
+
 
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -234,23 +292,133 @@ class ConnectionManager:
 
     def __init__(self, websocket: WebSocket):
         self.websocket = websocket
+        self.connection_id = str(uuid.uuid4())
+        self.writer = StreamWriter(
+            websocket,
+            flush_interval_ms=settings.stream_flush_interval_ms,
+            flush_bytes=settings.stream_flush_bytes,
+            max_queue=settings.stream_queue_size,
+            serializer=EventSerializer(binary=settings.ws_binary_frames),
+        )
         self.pending_requests: dict[str, asyncio.Future] = {}
+        # one orchestrator per chat so concurrent chats never share history
+        self.orchestrators: dict[str, ChatOrchestrator] = {}
+        # last scheduled turn of each chat, later turns wait for it
+        self.chat_tails: dict[str, asyncio.Task] = {}
+        self.turn_tasks: set[asyncio.Task] = set()
+        self.turn_slots = asyncio.Semaphore(settings.max_concurrent_turns)
+        self.background_tasks: set[asyncio.Task] = set()
+        # set while the socket is gone but turns are kept alive for a resume
+        self.detached = False
+        self.expiry: asyncio.TimerHandle | None = None
+        # the connection that resumed this one's chats, turns still queued here run there
+        self.successor: "ConnectionManager | None" = None
 
     async def connect(self):
         """Accepts a new connection."""
         await self.websocket.accept()
 
     def disconnect(self):
-        """Removes the pending requests and disconnect"""
+        """Cancels the pending requests, running turns get a grace period to be resumed"""
         for request_id, future in self.pending_requests.items():
             print(f"request {request_id} cancelled!")
             future.cancel()
+        for task in self.background_tasks:
+            task.cancel()
+        for orchestrator in self.orchestrators.values():
+            orchestrator.writer.detach()
+        self.detached = True
+        if self.turn_tasks:
+            self.expiry = asyncio.get_running_loop().call_later(settings.stream_resume_grace_seconds, self._expire)
+        else:
+            self._expire()
+
+    def _expire(self):
+        """Nobody resumed in time, stop generating"""
+        self.expiry = None
+        if not self.detached:
+            return
+        for task in self.turn_tasks:
+            task.cancel()
+
+    def current(self) -> "ConnectionManager":
+        """The manager owning this connection's chats now, after any resumes"""
+        manager = self
+        while manager.successor is not None:
+            manager = manager.successor
+        return manager
+
+    def adopt(self, previous: "ConnectionManager"):
+        """Takes over the chats and running turns of a dropped connection"""
+        if previous.expiry is not None:
+            previous.expiry.cancel()
+            previous.expiry = None
+        previous.detached = False
+        for chat_id, orchestrator in previous.orchestrators.items():
+            if chat_id in self.orchestrators:
+                continue
+            orchestrator.manager = self
+            orchestrator.websocket = self.websocket
+            orchestrator.writer.owner = self
+            # a chat with a message in flight is attached by its resume, after the replay
+            if orchestrator.writer.streaming is None:
+                orchestrator.writer.attach(self.writer)
+            self.orchestrators[chat_id] = orchestrator
+        previous.orchestrators = self.orchestrators
+        previous.successor = self
+        # share the containers, so done callbacks of either manager keep them tidy
+        previous.turn_tasks |= self.turn_tasks
+        self.turn_tasks = previous.turn_tasks
+        previous.chat_tails.update(self.chat_tails)
+        self.chat_tails = previous.chat_tails
+
+    async def resume(self, message_id: str, last_seq: int):
+        """Replays what the client missed of a message, then streams the rest live"""
+        log = stream_registry.get(message_id)
+        owner = log.channel.owner.current() if log is not None and log.channel.owner is not None else None
+        if owner is not None and owner is not self:
+            if not owner.detached:
+                # still streaming to another live connection
+                await self.writer.send_json({"type": "resume_failed", "messageId": message_id})
+                return
+            self.adopt(owner)
+        if not await stream_registry.resume(message_id, last_seq, self.writer):
+            await self.writer.send_json({"type": "resume_failed", "messageId": message_id})
+
+    def get_orchestrator(self, chat_id: str) -> ChatOrchestrator:
+        orchestrator = self.orchestrators.get(chat_id)
+        if orchestrator is None:
+            channel = StreamChannel(self.writer, stream_registry, owner=self)
+            orchestrator = ChatOrchestrator(manager=self,websocket=self.websocket,server_id="federation",session_pool=session_pool,writer=channel,store=conversation_store,usage=usage_tracker)
+            self.orchestrators[chat_id] = orchestrator
+        return orchestrator
+
+    def schedule_turn(self, message: dict):
+        """Runs a chat turn in the background, after any earlier turn of the same chat"""
+        chat_id = message.get("chatId")
+        previous = self.chat_tails.get(chat_id)
+        task = asyncio.create_task(self._run_turn(message, previous))
+        self.chat_tails[chat_id] = task
+        self.turn_tasks.add(task)
+
+        def _done(finished: asyncio.Task):
+            self.turn_tasks.discard(finished)
+            if self.chat_tails.get(chat_id) is finished:
+                del self.chat_tails[chat_id]
+
+        task.add_done_callback(_done)
+
+    async def _run_turn(self, message: dict, previous: asyncio.Task | None):
+        if previous is not None:
+            # wait for the earlier turn without inheriting its outcome
+            await asyncio.wait({previous})
+        # the turn may have been queued on a connection that was resumed since
+        async with self.current().turn_slots:
+            await self.current().get_orchestrator(message.get("chatId")).chat_loop(message=message)
+            print("Finished streaming advanced response.")
 
     async def _receiver_task(self):
         """Recives all WebSocket messages from the client"""
-        client = MCPClient()
-        orchestrator = ChatOrchestrator(manager=self,websocket=self.websocket)
-        await client.connect_to_server(server_url="http://127.0.0.1:8001/mcp/")
         try:
             while True:
                 received_message = await self.websocket.receive_json()
@@ -259,18 +427,23 @@ class ConnectionManager:
                 print(received_message)
                 if request_id and self.pending_requests.get(request_id):
                     future = self.pending_requests.pop(request_id)
-                    future.set_result(received_message)
+                    if not future.done():
+                        future.set_result(received_message)
+                    continue
 
                     # if any other messages came up they should be handled here
+                if received_message.get("type") == "resume":
+                    task = asyncio.create_task(
+                        self.resume(received_message.get("messageId"), int(received_message.get("lastSeq", -1)))
+                    )
+                    self.background_tasks.add(task)
+                    task.add_done_callback(self.background_tasks.discard)
+                    continue
+
                 if received_message.get("chatId"):
                     print("its a chat message")
-                    # Assuming this is a chat message
-                    prompt = received_message.get("content")[0]["text"]
-                    message_id = received_message.get("messageId")
-                    assistant_message_id = str(uuid.uuid4())
-
-
-                    await orchestrator.chat_loop(session=client.session,message=received_message)
+                    # turns run as tasks so RPC replies keep being read while they stream
+                    self.schedule_turn(received_message)
 
                     
 
@@ -293,7 +466,6 @@ class ConnectionManager:
                     #     "type": "end",
                     #     "messageId": assistant_message_id
                     # })
-                    print("Finished streaming advanced response.")
 
 
         except WebSocketDisconnect:
@@ -313,7 +485,7 @@ class ConnectionManager:
         request = {"request_id": request_id, "event": event, "payload": payload}
 
         try:
-            await self.websocket.send_json(request)
+            await self.writer.send_json(request)
             response = await asyncio.wait_for(future, timeout=timeout)
             return response
 
@@ -331,7 +503,7 @@ async def chat(manager,websocket):
     client = MCPClient()
     orchestrator = ChatOrchestrator()
     try:
-        await client.connect_to_server(server_url="http://127.0.0.1:8001/mcp/")
+        await client.connect_to_server(server_url=MCP_SERVER_URL)
         await orchestrator.chat_loop(client.session, manager, websocket)
         # response = await orchestrator.process_query(query, session)
     except WebSocketDisconnect:
@@ -349,10 +521,50 @@ def read_root():
     return {"Status": "Server is running"}
 
 
+@app.get("/metrics/mcp-pool")
+def read_pool_metrics():
+    return session_pool.stats()
+
+
+@app.get("/metrics/connections")
+def read_connection_metrics():
+    """outbound queue stats per connection, slowest clients first"""
+    connections = [
+        {"connectionId": manager.connection_id, **manager.writer.stats()}
+        for manager in active_connections
+    ]
+    return sorted(connections, key=lambda c: c["depth"], reverse=True)
+
+
+@app.get("/metrics/usage")
+def read_usage_metrics():
+    return usage_tracker.stats()
+
+
+@app.get("/metrics/embeddings")
+def read_embedding_metrics():
+    """hit rate of the query embedding cache and batch sizes of the query batcher"""
+    return {"cache": query_cache.stats(), "batcher": query_batcher.stats()}
+
+
+@app.get("/blobs/{blob_id}")
+def read_blob(blob_id: str):
+    """serves a stored tool result, FileResponse answers Range requests with 206"""
+    path = blob_store.path(blob_id)
+    if path is None or blob_store.size(blob_id) is None:
+        raise HTTPException(status_code=404, detail="blob not found")
+    return FileResponse(
+        path,
+        media_type="text/plain; charset=utf-8",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
 @app.websocket("/ws/connect")
 async def websocket_endpoint(websocket: WebSocket):
     manager = ConnectionManager(websocket)
     await manager.connect()
+    active_connections.add(manager)
 
     receiver_task = asyncio.create_task(manager._receiver_task())
     # main_task = asyncio.create_task(chat(manager,websocket))
@@ -365,9 +577,13 @@ async def websocket_endpoint(websocket: WebSocket):
     # Clean up by cancelling any remaining tasks
     for task in pending:
         task.cancel()
+    active_connections.discard(manager)
+    await manager.writer.close()
 
     print("WebSocket connection closed.")
 
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True)
+    # permessage-deflate is negotiated per connection when the browser offers it,
+    # large tool outputs and app parts compress very well
+    uvicorn.run("app:app", host="127.0.0.1", port=8000, reload=True, ws_per_message_deflate=settings.ws_per_message_deflate)
@@ -2,7 +2,7 @@ import json
 from pathlib import Path
 from typing import Any
 
-from pydantic import BaseSettings
+from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
@@ -12,12 +12,62 @@ class Settings(BaseSettings):
     chroma_path: str = "./chroma_db"
     tool_distance_threshold: float = 0.754
     model_name: str = "gemini-2.5-flash"
+    embedding_backend: str = "gemini"
+    embedding_model: str = "gemini-embedding-001"
+    hashing_embedding_dim: int = 512
+    embedding_cache_path: str = "./embedding_cache.sqlite3"
+    embedding_cache_size: int = 1024
+    blocking_pool_size: int = 4
+    embedding_batch_window_ms: float = 5.0
+    embedding_batch_max_size: int = 64
+    embedding_ingest_batch_size: int = 100
+    embedding_ingest_concurrency: int = 4
+    embedding_ingest_retries: int = 2
+    mcp_pool_size: int = 8
+    mcp_pool_health_check_interval: float = 30.0
+    mcp_servers_config: str | None = None
+    mcp_connect_timeout: float = 10.0
+    mcp_list_tools_timeout: float = 3.0
+    mcp_catalog_cache_path: str = "./mcp_catalogs.json"
+    tool_call_concurrency: int = 4
+    stream_flush_interval_ms: float = 30.0
+    stream_flush_bytes: int = 1024
+    stream_queue_size: int = 256
+    max_concurrent_turns: int = 2
+    conversation_db_path: str = "./conversations.sqlite3"
+    conversation_window_size: int = 200
+    conversation_cache_chats: int = 64
+    context_budget_tokens: int = 32000
+    context_summarize_ratio: float = 0.75
+    tool_result_digest_chars: int = 2000
+    blob_store_path: str = "./blobs"
+    blob_inline_chars: int = 8000
+    blob_preview_chars: int = 2000
+    blob_read_bytes: int = 4000
+    ws_binary_frames: bool = False
+    ws_per_message_deflate: bool = True
+    stream_replay_messages: int = 256
+    stream_replay_events: int = 2000
+    stream_resume_grace_seconds: float = 60.0
+    tool_budget_tokens: int = 4000
+    tool_description_chars: int = 300
+    lexical_name_similarity: float = 0.75
+    lexical_top_k: int = 5
+    rrf_k: int = 60
+    compact_vectors: bool = False
+    compact_vector_path: str = "./tool_vectors"
+    compact_vector_dim: int = 256
+    compact_vector_dtype: str = "int8"
+    compact_rerank_k: int = 100
 
     class Config:
         env_file = ".env"
         extra = "ignore"
 
 
+settings = Settings()
+
+
 def load_mcp_servers(config_path: str | None = None) -> dict[str, Any]:
     path = Path(config_path or Path(__file__).with_name("mcp_servers.json"))
     return json.loads(path.read_text())
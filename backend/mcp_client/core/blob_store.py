@@ -0,0 +1,80 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Any, Dict, Optional
+
+from ..config.settings import settings
+
+_BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    """
+    content-addressed store for large tool results.
+
+    a blob is written once under its sha256 and never changes, so the same
+    output stored twice takes no extra space and a blob id is safe to cache
+    and fetch by byte range.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, blob_id: str) -> Optional[str]:
+        """file path of a blob, or None for an invalid id."""
+        if not _BLOB_ID.match(blob_id or ""):
+            return None
+        return os.path.join(self.root, blob_id[:2], blob_id)
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_id)
+        if os.path.exists(path):
+            return blob_id
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # write then rename, so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return blob_id
+
+    def size(self, blob_id: str) -> Optional[int]:
+        path = self.path(blob_id)
+        if path is None or not os.path.exists(path):
+            return None
+        return os.path.getsize(path)
+
+    def read(self, blob_id: str, offset: int = 0, length: int = -1) -> Optional[bytes]:
+        path = self.path(blob_id)
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            f.seek(max(offset, 0))
+            return f.read(length)
+
+    def reference(self, blob_id: str, size: int) -> Dict[str, Any]:
+        """the handle sent to the browser in place of the full output."""
+        return {"id": blob_id, "size": size, "url": f"/blobs/{blob_id}"}
+
+
+def preview_text(text: str, blob_id: str, preview_chars: int) -> str:
+    """what the llm sees for an offloaded result: the start plus a handle to page through the rest."""
+    size = len(text.encode("utf-8"))
+    return (
+        f"{text[:preview_chars]}\n\n"
+        f"[truncated: the full result is {size} bytes, stored as blob {blob_id}. "
+        f"call read_blob with this blob_id and a byte offset to read more.]"
+    )
+
+
+blob_store = BlobStore(settings.blob_store_path)
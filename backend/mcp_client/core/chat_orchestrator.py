@@ -3,20 +3,28 @@ import json
 import os
 from typing import Any, Dict, List, Optional
 import uuid
-from click import prompt
-from openai import chat
+from contextlib import asynccontextmanager
 
-from .tooling import format_mcp_tools_for_db, build_available_tools
-from ..rag.set_vector_db import save_tools_to_vector_db
-from ..rag.retrieve_tools import get_relevant_tools_for_chat
+from .tooling import format_mcp_tools_for_db, select_tools, ToolOrder
+from .usage import UsageTracker, read_usage
+from .tool_stream import ToolCallAssembler
+from .stream_writer import StreamWriter
+from .context_window import ContextWindow
+from .blob_store import blob_store, preview_text
+from .tool_updates import ToolUpdateEncoder
+from ..utils.executor import run_blocking
+from ..utils.serializer import EventSerializer
+from ..rag.set_vector_db import asave_tools_to_vector_db
+from ..rag.retrieve_tools import aget_relevant_tools_for_chat
 from ..tools import registry as tool_registry
 from ..llm.openai_provider import OpenAIProvider
+from ..config.settings import settings
 
 from fastapi import WebSocket
 
 
 class ChatOrchestrator:
-    def __init__(self, instruction: Optional[str] = None, websocket: Optional[WebSocket] = None, manager: Any = None):
+    def __init__(self, instruction: Optional[str] = None, websocket: Optional[WebSocket] = None, manager: Any = None, server_id: str = "default", session_pool: Any = None, writer: Optional[StreamWriter] = None, store: Any = None, usage: Optional[UsageTracker] = None):
         self.instruction: str = (
             instruction
             or (
@@ -27,12 +35,29 @@ class ChatOrchestrator:
             )
         )
         self.websocket = websocket
+        self.writer = writer or (
+            StreamWriter(websocket, settings.stream_flush_interval_ms, settings.stream_flush_bytes, settings.stream_queue_size, EventSerializer(settings.ws_binary_frames))
+            if websocket else None
+        )
         self.manager = manager
+        self.server_id = server_id
+        self.session_pool = session_pool
+        self.store = store
+        self.usage = usage or UsageTracker()
+        self.tool_updates = ToolUpdateEncoder()
+        # the tools of this session's catalog within the shared tool cache
+        self.tool_scope = None
         self.messages: List[Dict[str, Any]] = []
         self.llm = OpenAIProvider(
             api_key=os.getenv("GOOGLE_API_KEY"),
             base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
         )
+        self.context = ContextWindow(
+            self.llm,
+            budget_tokens=settings.context_budget_tokens,
+            summarize_ratio=settings.context_summarize_ratio,
+            tool_result_chars=settings.tool_result_digest_chars,
+        )
 
         self.custom_tools: List[Dict[str, Any]] = [
             {
@@ -55,13 +80,138 @@ class ChatOrchestrator:
                         "type": "object",
                     },
                 },
-            }
+            },
+            {
+                "type": "function",
+                "function": {
+                    "name": "read_blob",
+                    "description": (
+                        "Reads part of a large tool result that was truncated. "
+                        "Pass the blob_id from the truncation note and the byte offset to continue from."
+                    ),
+                    "parameters": {
+                        "properties": {
+                            "blob_id": {"type": "string", "description": "id of the stored result"},
+                            "offset": {"type": "integer", "description": "byte offset to start reading from"},
+                            "length": {"type": "integer", "description": "number of bytes to read"},
+                        },
+                        "required": ["blob_id"],
+                        "type": "object",
+                    },
+                },
+            },
         ]
+        # custom tools lead the tool block, mcp tools keep their first-seen order
+        self.tool_order = ToolOrder([tool["function"]["name"] for tool in self.custom_tools])
+    @asynccontextmanager
+    async def lease_session(self, session=None):
+        """yields the given session, or borrows one from the pool for the block."""
+        if session is not None or self.session_pool is None:
+            yield session
+            return
+        async with self.session_pool.lease() as leased:
+            yield leased
+
+    async def add_message(self, chat_id: str, message: Dict[str, Any]):
+        """appends to the history, persisting it when a conversation store is set."""
+        if self.store is None:
+            self.messages.append(message)
+        else:
+            await self.store.aappend(chat_id, message, self.messages)
+
+    async def first_seq(self, chat_id: str) -> int:
+        """seq of self.messages[0] within the chat, the context window locates its summary by it."""
+        if self.store is None:
+            return 0
+        return await self.store.afirst_seq(chat_id, self.messages)
+
     async def send_delayed_message(self,message,delay):
         await asyncio.sleep(delay)
-        await self.websocket.send_json(message)
+        await self.writer.send_json(message)
+
+    def spawn_background(self, coroutine) -> asyncio.Task:
+        """runs a coroutine as one of the connection's background tasks, disconnect() cancels it."""
+        task = asyncio.create_task(coroutine)
+        if self.manager is not None:
+            self.manager.background_tasks.add(task)
+            task.add_done_callback(self.manager.background_tasks.discard)
+        return task
         
-    async def process_query(self, message: str, session,send_request=None) -> str:
+    async def send_tool_state(self, part_message: Dict[str, Any], part_index: int, tool: Dict[str, Any]):
+        """sends a tool part once in full, then only the fields that changed."""
+        update = self.tool_updates.encode(part_message, part_index, tool)
+        if update is not None:
+            await self.writer.send_json(update)
+
+    async def offload_result(self, tool: Dict[str, Any], result: str) -> str:
+        """
+        stores a large tool result in the blob store once and returns a preview
+        with its handle. the tool part gets a blob reference the browser can
+        fetch by range instead of the full output.
+        """
+        if len(result) <= settings.blob_inline_chars:
+            return result
+        try:
+            blob_id = await run_blocking(blob_store.put, result)
+        except Exception as e:
+            print(f"blob store error: {e}")
+            return result
+        tool["blob"] = blob_store.reference(blob_id, len(result.encode("utf-8")))
+        return preview_text(result, blob_id, settings.blob_preview_chars)
+
+    async def run_tool_call(self, tool: Dict[str, Any], part_index: int, part_message: Dict[str, Any], session, semaphore: asyncio.Semaphore, conversations: List[Dict[str, Any]]):
+        """
+        runs a single tool call under the per-turn semaphore and sends its
+        input-available and output-available states as soon as they happen.
+
+        returns (parsed_args, result, retrieved_tools) where retrieved_tools is
+        set when retrieve_tools found new tools.
+        """
+        tool_name = tool.get("name")
+        tool_args = tool.get("input")
+        try:
+            parsed_args = json.loads(tool_args) if tool_args else {}
+        except Exception:
+            parsed_args = {}
+
+        async with semaphore:
+            print(f"calling {tool_name} with args {tool_args}")
+            if self.websocket:
+                tool["state"] = "input-available"
+                await self.send_tool_state(part_message, part_index, tool)
+
+            retrieved_tools = None
+            try:
+                if tool_registry.has(tool_name):
+                    call_args = {**parsed_args, "conversations": conversations}
+                    if tool_name == "retrieve_tools":
+                        call_args["scope"] = self.tool_scope
+                    custom_result = await tool_registry.acall(tool_name, **call_args)
+                    if tool_name in ["retrieve_tools"]:
+                        retrieved_tools = custom_result or None
+                        result = custom_result or "Tool Not Found!"
+                    else:
+                        result = custom_result
+                else:
+                    async with self.lease_session(session) as leased:
+                        result = await leased.call_tool(tool_name, parsed_args)
+                    result = result.content[0].text
+            except Exception as e:
+                print(f"tool {tool_name} failed: {e}")
+                result = f"Tool error: {e}"
+
+            if retrieved_tools is None:
+                result = await self.offload_result(tool, str(result))
+            print("tool result:",result)
+
+            if self.websocket:
+                tool["state"] = "output-available"
+                tool["output"] = str(result)
+                await self.send_tool_state(part_message, part_index, tool)
+
+        return parsed_args, result, retrieved_tools
+
+    async def process_query(self, message: str, session=None,send_request=None) -> str:
         websocket = self.websocket
         chat_id = message.get("chatId")
         query = message.get("content")[0]["text"]
@@ -73,52 +223,63 @@ class ChatOrchestrator:
             "payload":{},
             "status":""
         } 
-        self.messages.append({"role": "user", "content": query})
+        self.tool_updates.reset()
+        if self.store is not None:
+            self.messages = await self.store.aload(chat_id)
+        await self.add_message(chat_id, {"role": "user", "content": query})
         streaming = True
+        next_message_id = None
         current_stream = ""
-        await websocket.send_json({
+        await self.writer.send_json({
                 "type": "start",
                 "messageId": assistant_message_id,
             })
         try:
             try:
-                mcp_tools_list = await session.list_tools()
+                async with self.lease_session(session) as leased:
+                    mcp_tools_list = await leased.list_tools()
             except Exception as e:
                 print(f"list_tools error: {e}")
                 mcp_tools_list = []
             embedding_ready_tools = format_mcp_tools_for_db(mcp_tools_list)
-            save_tools_to_vector_db(embedding_ready_tools)
-            relevant_tools = get_relevant_tools_for_chat(self.messages, "tools", 0.754, top_k_fallback=3)
+            scope = await asave_tools_to_vector_db(embedding_ready_tools, server_id=self.server_id)
+            if scope is not None:
+                self.tool_scope = scope
+            relevant_tools = await aget_relevant_tools_for_chat(self.messages, self.tool_scope, 0.754, top_k_fallback=3, with_distances=True)
 
-            print(f"Relevant tool names: {relevant_tools}")
-            available_tools = build_available_tools(mcp_tools_list, relevant_tools, self.custom_tools)
+            print(f"Relevant tool names: {[name for name, _ in relevant_tools]}")
+            available_tools = self.tool_order.arrange(select_tools(
+                mcp_tools_list, relevant_tools, self.custom_tools, settings.tool_budget_tokens, settings.tool_description_chars
+            ))
             final_text: List[str] = []
             is_response_ready = False
 
             if websocket:
                 print('sending log')
                 log_message["status"] = f"Found {len(relevant_tools)} Relevant Tools."
-                await websocket.send_json(log_message)
+                await self.writer.send_json(log_message)
 
 
+            turn_usage = {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+            llm_requests = 0
             response_index = -1
             while not is_response_ready:
                 print("CALLING LLM")
                 if not streaming:
-                    assistant_message_id = str(uuid.uuid4())
-                    await websocket.send_json({
+                    assistant_message_id = next_message_id
+                    await self.writer.send_json({
                             "type": "start",
                             "messageId": assistant_message_id,
                         })
                 log_message["status"] = "Generating Response ..."
-                asyncio.create_task(self.send_delayed_message(log_message,2))
-                print(self.messages)
+                self.spawn_background(self.send_delayed_message(log_message,2))
+                system, context_messages = self.context.build(self.instruction, self.messages, await self.first_seq(chat_id))
 
 
                 try:
                     stream = self.llm.generate(
-                            system=self.instruction,
-                            messages=self.messages,
+                            system=system,
+                            messages=context_messages,
                             tools=available_tools,
                             model="gemini-2.5-flash",
                             temperature=1,
@@ -135,11 +296,42 @@ class ChatOrchestrator:
                     }
 
                     is_response_ready = True
-                    final_tool_calls = {}
+                    assembler = ToolCallAssembler()
+                    semaphore = asyncio.Semaphore(settings.tool_call_concurrency)
+                    conversations = list(self.messages)
+                    tool_parts = []
+                    tool_parts_by_key = {}
+                    tool_tasks = {}
+
+                    async def on_tool_event(event, key, call):
+                        nonlocal response_index, current_stream
+                        if event == "new":
+                            current_stream = 'tool'
+                            response_index += 1
+                            tool_obj = {"id":call["id"],"name":call["name"],"input":call["arguments"],"output":"","state":"input-streaming"}
+                            tool_parts_by_key[key] = (response_index, tool_obj)
+                            tool_parts.append((response_index, tool_obj))
+                            llm_full_response.append({"tool":tool_obj})
+                        part_index, tool_obj = tool_parts_by_key[key]
+                        tool_obj.update({"id": call["id"], "name": call["name"], "input": call["arguments"]})
+
+                        if event == "complete":
+                            # dispatch right away, the stream may still be running
+                            tool_tasks[part_index] = asyncio.create_task(
+                                self.run_tool_call(tool_obj, part_index, content_part_start_message, session, semaphore, conversations)
+                            )
+                        elif tool_obj["state"] == "input-streaming":
+                            await self.send_tool_state(content_part_start_message, part_index, tool_obj)
+
+                    llm_requests += 1
+                    request_usage = None
                     async for chunk in stream:
-                        print(chunk.choices[0].delta)
-                        print('*'*80)
-                        if chunk and chunk.choices[0].delta.content:
+                        if chunk and getattr(chunk, "usage", None):
+                            # the last usage of a request covers all of it
+                            request_usage = read_usage(chunk.usage)
+                        if not chunk or not chunk.choices:
+                            continue
+                        if chunk.choices[0].delta.content:
                             content = chunk.choices[0].delta.content
 
                             if current_stream != "text":
@@ -148,7 +340,7 @@ class ChatOrchestrator:
                                 llm_full_response.append({"text":content})
                                 content_part_start_message["part"] = { "text": "" }
                                 content_part_start_message["partIndex"] = response_index
-                                await websocket.send_json(content_part_start_message)
+                                await self.writer.send_json(content_part_start_message)
                                 
                             elif current_stream == "text":
                                 llm_full_response[-1]["text"] += content
@@ -160,120 +352,70 @@ class ChatOrchestrator:
                                 "text": content,
                                 "status": "Generating resonse ..."
                                 }
-                            await websocket.send_json(chunk_message)
+                            await self.writer.send_json(chunk_message)
                         # handling tools stream
-                        elif chunk and chunk.choices[0].delta.tool_calls:
-                            for tool in chunk.choices[0].delta.tool_calls or []:
-                                index = tool.index
-                                if index is None:
-                                    index = uuid.uuid1()
-                                    final_tool_calls[index] = tool
-                                    break
-                                if index not in final_tool_calls:
-                                    final_tool_calls[index] = tool
-
-                                final_tool_calls[index].function.arguments += tool.function.arguments
-                            
-                    for tool_index in final_tool_calls.keys():
-                        current_stream = 'tool'
-                        tool = final_tool_calls[tool_index]
-                        response_index += 1
-                        tool_name = tool.function.name
-                        tool_args = tool.function.arguments
-                        tool_id = tool.id
-                        tool_state = "input-streaming"
-                        tool_output = ""
-                        tool_obj = {"id":tool_id,"name":tool_name,"input":tool_args,"output":tool_output,"state":tool_state}
-                        content_part_start_message["part"] = { "tool": tool_obj }
-                        content_part_start_message["partIndex"] = response_index
-                        await websocket.send_json(content_part_start_message)
-                        llm_full_response.append({"tool":tool_obj})
+                        elif chunk.choices[0].delta.tool_calls:
+                            for tool_event in assembler.feed(chunk.choices[0].delta.tool_calls):
+                                await on_tool_event(*tool_event)
+
+                    for tool_event in assembler.finish():
+                        await on_tool_event(*tool_event)
+
+                    for key, value in (request_usage or {}).items():
+                        turn_usage[key] += value
                     
-                        # print("-"*80)
                 except Exception as e:
+                    for task in tool_tasks.values():
+                        task.cancel()
                     print(f"LLM generate error: {e}")
                     if self.websocket:
-                        await self.websocket.send_json({"log": f"LLM error: {e}"})
+                        await self.writer.send_json({"log": f"LLM error: {e}"})
                     raise
 
                 restart_while_loop = False
-                for response_index, content in enumerate(llm_full_response):
+                for content in llm_full_response:
                     if "text" in list(content.keys()):
-                        self.messages.append({"role": "assistant", "content": content["text"]})
-
-                    elif "tool" in list(content.keys()):
-                        is_response_ready = False
-                        print("LLM called tools")
-                        tool = content["tool"]
-                        tool_name = tool.get("name")
-                        tool_args = tool.get("input")
-                        tool_id = tool.get("id")
-                        print(f"calling {tool_name} with args {tool_args}")
-                        if self.websocket:
-                            tool["state"] = "input-available"
-                            content_part_start_message["part"] = { "tool": tool}
-                            content_part_start_message["partIndex"] = response_index
-                            await self.websocket.send_json(content_part_start_message)
-
-                        if tool_registry.has(tool_name):
-                            parsed_args = {}
-                            try:
-                                parsed_args = json.loads(tool_args) if tool_args else {}
-                            except Exception:
-                                parsed_args = {}
-                            parsed_args["conversations"] = self.messages
-                            custom_result = tool_registry.call(tool_name, **parsed_args)
-
-                            if tool_name in ["retrieve_tools"]:
-                                if custom_result:
-                                    available_tools = build_available_tools(
-                                        mcp_tools_list, custom_result, self.custom_tools
-                                    )
-                                    restart_while_loop = True
-                                    break
-                                else:
-                                    result = "Tool Not Found!"
-                            result = custom_result
-
-                        else:
-                            try:
-                                parsed_args = json.loads(tool_args) if tool_args else {}
-                            except Exception:
-                                parsed_args = {}
-                            result = await session.call_tool(tool_name, parsed_args)
-                            result = result.content[0].text
-
-                        print("tool result:",result)
-
-                        self.messages.append(
+                        await self.add_message(chat_id, {"role": "assistant", "content": content["text"]})
+
+                if tool_parts:
+                    is_response_ready = False
+                    print("LLM called tools")
+                    outcomes = await asyncio.gather(*(tool_tasks[part_index] for part_index, _ in tool_parts))
+
+                    # results go back into the history in the original tool call order
+                    for (_, tool), (parsed_args, result, retrieved_tools) in zip(tool_parts, outcomes):
+                        if retrieved_tools:
+                            available_tools = self.tool_order.arrange(select_tools(
+                                mcp_tools_list, retrieved_tools, self.custom_tools, settings.tool_budget_tokens, settings.tool_description_chars
+                            ))
+                            restart_while_loop = True
+                            continue
+
+                        await self.add_message(
+                            chat_id,
                             {
                                 "role": "assistant",
                                 "tool_calls": [
                                     {
                                         "function": {
                                             "arguments": json.dumps(parsed_args),
-                                            "name": tool_name,
+                                            "name": tool.get("name"),
                                         },
-                                        "id": tool_id,
+                                        "id": tool.get("id"),
                                         "type": "function",
                                     }
                                 ],
                             }
                         )
-                        self.messages.append(
+                        await self.add_message(
+                            chat_id,
                             {
-                                "tool_call_id": tool_id,
+                                "tool_call_id": tool.get("id"),
                                 "role": "tool",
-                                "name": tool_name,
+                                "name": tool.get("name"),
                                 "content": str(result),
                             }
                         )
-                        if self.websocket:
-                            tool["state"] = "output-available"
-                            tool["output"] = str(result)
-                            content_part_start_message["part"] = { "tool": tool}
-                            content_part_start_message["partIndex"] = response_index
-                            await self.websocket.send_json(content_part_start_message)                       
 
                 if restart_while_loop:
                     continue
@@ -281,18 +423,25 @@ class ChatOrchestrator:
                 response_index = -1
                 current_stream = ''
 
-                await self.websocket.send_json({
+                end_message = {
                     "type": "end",
                     "messageId": assistant_message_id
-                })
-        
+                }
+                if not is_response_ready:
+                    # named up front, so a client that drops before the next start can still resume it
+                    next_message_id = str(uuid.uuid4())
+                    end_message["next"] = next_message_id
+                await self.writer.send_json(end_message)
 
+            self.usage.record(chat_id, turn_usage, llm_requests)
+            # summarize older turns off the reply path
+            self.context.schedule_summary(self.messages, await self.first_seq(chat_id))
             return "\n".join(final_text)
         except Exception as e:
             print(f"process_query error: {e}")
             return ""
 
-    async def chat_loop(self, session,message):
+    async def chat_loop(self, message, session=None):
         print("\nMCP Client Started!")
         print("Type your queries or 'quit' to exit.")
 
@@ -302,7 +451,7 @@ class ChatOrchestrator:
             if websocket and manager:
                 response = await self.process_query(message, session)
                 print("\n" + (response or ""))
-                await websocket.send_json({"response": response})
+                await self.writer.send_json({"response": response})
             else:
                 print("Doing nothing. Please pass connection manager and websocket")
         except Exception as e:
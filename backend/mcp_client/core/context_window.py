@@ -0,0 +1,166 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+SUMMARY_INSTRUCTION = (
+    "you maintain a running summary of a conversation between a user and an assistant that uses tools. "
+    "merge the previous summary with the new messages into one concise summary. keep names, numbers, "
+    "decisions, open questions and anything the user asked to remember. reply with the summary only."
+)
+
+
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    """rough token count of one chat message, about four characters per token."""
+    content = message.get("content") or ""
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    size = len(content)
+    if message.get("tool_calls"):
+        size += len(json.dumps(message["tool_calls"], default=str))
+    # per-message overhead for role and framing
+    return size // 4 + 4
+
+
+def digest_tool_result(content: str, max_chars: int) -> str:
+    """keeps the head and tail of a long tool result and notes what was cut."""
+    if len(content) <= max_chars:
+        return content
+    head = content[: max_chars * 2 // 3]
+    tail = content[-(max_chars // 3):] if max_chars >= 3 else ""
+    omitted = len(content) - len(head) - len(tail)
+    return f"{head}\n... [{omitted} of {len(content)} characters omitted] ...\n{tail}"
+
+
+def _render(message: Dict[str, Any], max_chars: int) -> str:
+    role = message.get("role")
+    if message.get("tool_calls"):
+        calls = ", ".join(
+            f"{call['function']['name']}({call['function']['arguments']})" for call in message["tool_calls"]
+        )
+        return f"assistant called {calls}"
+    content = str(message.get("content") or "")
+    if role == "tool":
+        return f"tool {message.get('name')} returned: {digest_tool_result(content, max_chars)}"
+    return f"{role}: {content}"
+
+
+class ContextWindow:
+    """
+    builds the message list sent to the llm for one chat.
+
+    older turns are folded into a running summary by a background task that
+    runs after a turn ends, so the next reply never waits for it. the summary
+    covers every message before `_boundary`, the seq of a user message. seqs
+    count the messages of the chat from its start, callers pass `first_seq`,
+    the seq of the first message in the list they hand in. tool
+    results from earlier turns are sent as digests, and if the request is
+    still over budget the oldest whole turns are left out.
+    """
+
+    def __init__(
+        self,
+        llm,
+        budget_tokens: int = 32000,
+        summarize_ratio: float = 0.75,
+        tool_result_chars: int = 2000,
+        model: str = "gemini-2.5-flash",
+    ):
+        self.llm = llm
+        self.budget_tokens = budget_tokens
+        self.summarize_ratio = summarize_ratio
+        self.tool_result_chars = tool_result_chars
+        self.model = model
+        self.summary = ""
+        self._boundary: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _start(self, messages: List[Dict[str, Any]], first_seq: int) -> int:
+        """index of the first message not covered by the summary."""
+        if self._boundary is None:
+            return 0
+        # below zero it was trimmed out of the window, everything left is newer than the summary
+        return min(max(self._boundary - first_seq, 0), len(messages))
+
+    @staticmethod
+    def _user_indexes(messages: List[Dict[str, Any]]) -> List[int]:
+        return [i for i, message in enumerate(messages) if message.get("role") == "user"]
+
+    def build(self, system: str, messages: List[Dict[str, Any]], first_seq: int = 0) -> Tuple[str, List[Dict[str, Any]]]:
+        """returns (system, messages) for the next llm request."""
+        recent = messages[self._start(messages, first_seq):]
+        user_indexes = self._user_indexes(recent)
+        current_turn = user_indexes[-1] if user_indexes else 0
+
+        prepared = []
+        for i, message in enumerate(recent):
+            content = message.get("content")
+            if i < current_turn and message.get("role") == "tool" and isinstance(content, str):
+                message = {**message, "content": digest_tool_result(content, self.tool_result_chars)}
+            prepared.append(message)
+
+        # the summary leads the messages instead of extending the system prompt,
+        # so the system prompt and tool block stay identical for prefix caching
+        lead = []
+        if self.summary:
+            lead = [{"role": "user", "content": f"summary of the earlier conversation:\n{self.summary}"}]
+
+        budget = self.budget_tokens - estimate_tokens({"content": system}) - sum(map(estimate_tokens, lead))
+        sizes = [estimate_tokens(message) for message in prepared]
+        total = sum(sizes)
+        cut = 0
+        # never drop the current turn, even if it alone is over budget
+        for boundary in user_indexes[1:]:
+            if total <= budget:
+                break
+            total -= sum(sizes[cut:boundary])
+            cut = boundary
+        if cut:
+            print(f"context over budget, left out {cut} older messages ({total} tokens sent)")
+        return system, lead + prepared[cut:]
+
+    def schedule_summary(self, messages: List[Dict[str, Any]], first_seq: int = 0):
+        """
+        starts a background summary of the older turns once the unsummarized
+        history passes summarize_ratio of the budget. the newest turns worth
+        about half the budget are kept verbatim.
+        """
+        if self._task is not None and not self._task.done():
+            return
+        start = self._start(messages, first_seq)
+        sizes = [estimate_tokens(message) for message in messages[start:]]
+        if sum(sizes) <= self.budget_tokens * self.summarize_ratio:
+            return
+
+        keep = self.budget_tokens // 2
+        boundary = None
+        for i in reversed(self._user_indexes(messages[start:])):
+            if i == 0:
+                break
+            boundary = i
+            if sum(sizes[i:]) >= keep:
+                break
+        if boundary is None:
+            return
+
+        older = list(messages[start:start + boundary])
+        self._task = asyncio.create_task(self._summarize(older, first_seq + start + boundary))
+
+    async def _summarize(self, older: List[Dict[str, Any]], boundary: int):
+        transcript = "\n".join(_render(message, self.tool_result_chars // 4) for message in older)
+        prompt = (
+            f"previous summary:\n{self.summary or '(none)'}\n\n"
+            f"new messages:\n{transcript}"
+        )
+        try:
+            summary = await self.llm.complete(
+                system=SUMMARY_INSTRUCTION,
+                messages=[{"role": "user", "content": prompt}],
+                model=self.model,
+            )
+        except Exception as e:
+            print(f"summarization failed: {e}")
+            return
+        if summary.strip():
+            self.summary = summary.strip()
+            self._boundary = boundary
+            print(f"summarized {len(older)} messages into {estimate_tokens({'content': self.summary})} tokens")
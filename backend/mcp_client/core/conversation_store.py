@@ -0,0 +1,202 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from ..utils.executor import run_blocking
+
+
+class ConversationStore:
+    """
+    per-chat message history backed by an append-only sqlite log.
+
+    only the most recent `window_size` messages of the `max_chats` most
+    recently used chats are kept in memory. an evicted or never-seen chat
+    is rehydrated from disk the next time it is loaded. windows are trimmed
+    in place so a list returned by load() stays valid for the whole turn.
+    """
+
+    def __init__(self, path: str, window_size: int = 200, max_chats: int = 64):
+        self.path = path
+        self.window_size = window_size
+        self.max_chats = max_chats
+        self._windows: OrderedDict[str, List[Dict[str, Any]]] = OrderedDict()
+        self._next_seq: Dict[str, int] = {}
+        # writes handed a seq but not persisted yet, the seq counter of a chat
+        # outlives its window until they are done, sqlite does not know them
+        self._pending: Dict[str, int] = {}
+        self._conn: sqlite3.Connection | None = None
+        # _lock guards the in-memory windows, _db_lock the sqlite connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "chat_id TEXT NOT NULL, seq INTEGER NOT NULL, body TEXT NOT NULL, "
+                "PRIMARY KEY (chat_id, seq))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _trim(self, window: List[Dict[str, Any]]):
+        """drops the oldest messages, cutting only in front of a user message."""
+        if len(window) <= self.window_size:
+            return
+        cut = len(window) - self.window_size
+        while cut < len(window) and window[cut].get("role") != "user":
+            cut += 1
+        if cut < len(window):
+            del window[:cut]
+
+    def _cache(self, chat_id: str, window: List[Dict[str, Any]]):
+        self._windows[chat_id] = window
+        self._windows.move_to_end(chat_id)
+        while len(self._windows) > self.max_chats:
+            evicted, _ = self._windows.popitem(last=False)
+            if not self._pending.get(evicted):
+                self._next_seq.pop(evicted, None)
+
+    def _cached(self, chat_id: str) -> List[Dict[str, Any]] | None:
+        with self._lock:
+            window = self._windows.get(chat_id)
+            if window is not None:
+                self._windows.move_to_end(chat_id)
+            return window
+
+    def _max_seq(self, chat_id: str) -> int:
+        with self._db_lock:
+            row = self._db().execute(
+                "SELECT MAX(seq) FROM messages WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return row[0] if row and row[0] is not None else -1
+
+    def load(self, chat_id: str) -> List[Dict[str, Any]]:
+        """returns the in-memory window of a chat, reading it from disk if needed."""
+        window = self._cached(chat_id)
+        if window is not None:
+            return window
+
+        with self._db_lock:
+            rows = self._db().execute(
+                "SELECT seq, body FROM messages WHERE chat_id = ? ORDER BY seq DESC LIMIT ?",
+                (chat_id, self.window_size),
+            ).fetchall()
+        rows.reverse()
+        window = [json.loads(body) for _, body in rows]
+        if rows and not any(message.get("role") == "user" for message in window):
+            # a tool exchange longer than the window, reach back to the user message that started it
+            with self._db_lock:
+                db = self._db()
+                start = db.execute(
+                    "SELECT MAX(seq) FROM messages WHERE chat_id = ? AND seq < ? "
+                    "AND json_extract(body, '$.role') = 'user'",
+                    (chat_id, rows[0][0]),
+                ).fetchone()[0]
+                if start is not None:
+                    rows = db.execute(
+                        "SELECT seq, body FROM messages WHERE chat_id = ? AND seq >= ? ORDER BY seq",
+                        (chat_id, start),
+                    ).fetchall()
+            window = [json.loads(body) for _, body in rows]
+        # never start a window in the middle of a tool exchange
+        while window and window[0].get("role") != "user":
+            window.pop(0)
+
+        with self._lock:
+            self._next_seq[chat_id] = rows[-1][0] + 1 if rows else 0
+            self._cache(chat_id, window)
+        return window
+
+    async def aload(self, chat_id: str) -> List[Dict[str, Any]]:
+        window = self._cached(chat_id)
+        if window is not None:
+            return window
+        return await run_blocking(self.load, chat_id)
+
+    async def afirst_seq(self, chat_id: str, window: List[Dict[str, Any]]) -> int:
+        """
+        seq of the first message of a window returned by load(). windows
+        are contiguous runs of the log ending at its newest message.
+        """
+        with self._lock:
+            next_seq = self._next_seq.get(chat_id)
+        if next_seq is None:
+            # the chat was evicted since it was loaded
+            next_seq = await run_blocking(self._max_seq, chat_id) + 1
+        return max(next_seq - len(window), 0)
+
+    def _remember(
+        self, chat_id: str, message: Dict[str, Any], window: List[Dict[str, Any]] | None = None, next_seq: int | None = None
+    ) -> int:
+        if next_seq is None and chat_id not in self._next_seq:
+            # rare: the chat was evicted since it was loaded
+            next_seq = self._max_seq(chat_id) + 1
+        with self._lock:
+            if chat_id not in self._next_seq:
+                self._next_seq[chat_id] = next_seq
+            seq = self._next_seq[chat_id]
+            self._next_seq[chat_id] = seq + 1
+            self._pending[chat_id] = self._pending.get(chat_id, 0) + 1
+
+            if window is None:
+                window = self._windows.get(chat_id)
+            if window is not None:
+                window.append(message)
+                self._trim(window)
+                self._cache(chat_id, window)
+            return seq
+
+    def _settle(self, chat_id: str):
+        with self._lock:
+            pending = self._pending.get(chat_id, 0) - 1
+            if pending > 0:
+                self._pending[chat_id] = pending
+                return
+            self._pending.pop(chat_id, None)
+            if chat_id not in self._windows:
+                # evicted while writes were pending
+                self._next_seq.pop(chat_id, None)
+
+    def _persist(self, chat_id: str, seq: int, message: Dict[str, Any]):
+        body = json.dumps(message, default=str)
+        with self._db_lock:
+            db = self._db()
+            db.execute(
+                "INSERT INTO messages (chat_id, seq, body) VALUES (?, ?, ?)", (chat_id, seq, body)
+            )
+            db.commit()
+
+    def append(self, chat_id: str, message: Dict[str, Any], window: List[Dict[str, Any]] | None = None):
+        seq = self._remember(chat_id, message, window)
+        try:
+            self._persist(chat_id, seq, message)
+        finally:
+            self._settle(chat_id)
+
+    async def aappend(self, chat_id: str, message: Dict[str, Any], window: List[Dict[str, Any]] | None = None):
+        """
+        appends to the in-memory window right away and writes the log on the
+        thread pool. passing the window returned by load() keeps it live even
+        if it was evicted in the meantime.
+        """
+        next_seq = None
+        if chat_id not in self._next_seq:
+            # the chat was evicted since it was loaded, its last seq is read off the loop
+            next_seq = await run_blocking(self._max_seq, chat_id) + 1
+        seq = self._remember(chat_id, message, window, next_seq)
+        try:
+            await run_blocking(self._persist, chat_id, seq, message)
+        finally:
+            self._settle(chat_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_chats": len(self._windows),
+            "cached_messages": sum(len(window) for window in self._windows.values()),
+        }
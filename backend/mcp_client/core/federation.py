@@ -0,0 +1,220 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from mcp.types import Tool
+
+from ..utils.executor import run_blocking
+from .session_pool import MCPSessionPool
+
+SEPARATOR = "__"
+
+
+def namespace_server(name: str) -> str:
+    """server name usable as a tool name prefix, never containing SEPARATOR."""
+    return re.sub(r"[^a-zA-Z0-9-]+", "_", name).strip("_") or "server"
+
+
+class _ServerCatalog:
+    def __init__(self, tools: List[Any], fetched_at: float):
+        self.tools = tools
+        self.fetched_at = fetched_at
+
+
+class MCPFederation:
+    """
+    several MCP servers behind the lease() interface of MCPSessionPool.
+
+    every server gets its own session pool. list_tools asks all servers at
+    once and waits at most `list_timeout` seconds. a server that is slower,
+    or failing, is served from its last catalog and marked stale while its
+    fetch carries on in the background and refreshes the catalog for a later
+    turn. stale servers are not waited for again until a fetch succeeds
+    within the timeout. catalogs are also written to `catalog_path`, so a
+    server that is down after a restart still has its tools.
+
+    tool names are prefixed with the server name and SEPARATOR, call_tool
+    strips the prefix again and routes the call to the owning server.
+    """
+
+    def __init__(
+        self,
+        servers: Dict[str, Dict[str, Any]],
+        size: int = 8,
+        health_check_interval: float = 30.0,
+        connect_timeout: float = 10.0,
+        list_timeout: float = 3.0,
+        catalog_path: Optional[str] = None,
+    ):
+        if not servers:
+            raise ValueError("MCP federation needs at least one server.")
+        self.pools: Dict[str, MCPSessionPool] = {}
+        for name, entry in servers.items():
+            prefix = namespace_server(name)
+            if prefix in self.pools:
+                raise ValueError(f"MCP servers '{name}' and another server share the prefix '{prefix}'.")
+            # the config carries headers and auth of url servers too, a single
+            # server config connects to it directly without prefixing its tools
+            self.pools[prefix] = MCPSessionPool(
+                entry.get("url"),
+                size=size,
+                health_check_interval=health_check_interval,
+                config={"mcpServers": {name: entry}},
+            )
+        self.connect_timeout = connect_timeout
+        self.list_timeout = list_timeout
+        self.catalog_path = catalog_path
+        self.catalogs: Dict[str, _ServerCatalog] = {}
+        self.stale: Dict[str, str] = {}
+        self._fetches: Dict[str, asyncio.Task] = {}
+        self._load_catalogs()
+
+    def _load_catalogs(self):
+        if not self.catalog_path or not os.path.exists(self.catalog_path):
+            return
+        try:
+            with open(self.catalog_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for prefix, catalog in saved.items():
+                if prefix in self.pools:
+                    tools = [Tool.model_validate(tool) for tool in catalog["tools"]]
+                    self.catalogs[prefix] = _ServerCatalog(tools, catalog["fetched_at"])
+                    self.stale[prefix] = "not fetched since restart"
+        except Exception as e:
+            print(f"could not read MCP catalog cache: {e}")
+
+    def _save_catalogs(self):
+        if not self.catalog_path:
+            return
+        saved = {
+            prefix: {
+                "fetched_at": catalog.fetched_at,
+                "tools": [tool.model_dump(mode="json", exclude_none=True) for tool in catalog.tools],
+            }
+            for prefix, catalog in self.catalogs.items()
+        }
+        # every worker saves its own catalogs, a shared temp name could be replaced mid-write
+        tmp_path = f"{self.catalog_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(saved, f)
+            os.replace(tmp_path, self.catalog_path)
+        except Exception as e:
+            print(f"could not write MCP catalog cache: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    async def start(self, warm: Optional[int] = None):
+        """warms every pool at once, a server that does not answer in time is skipped."""
+        async def start_pool(prefix: str, pool: MCPSessionPool):
+            try:
+                await asyncio.wait_for(pool.start(warm), timeout=self.connect_timeout)
+            except Exception as e:
+                print(f"MCP server '{prefix}' did not start: {e!r}")
+
+        await asyncio.gather(*(start_pool(prefix, pool) for prefix, pool in self.pools.items()))
+
+    async def close(self):
+        for task in self._fetches.values():
+            task.cancel()
+        await asyncio.gather(*(pool.close() for pool in self.pools.values()), return_exceptions=True)
+
+    @asynccontextmanager
+    async def lease(self):
+        """
+        yields the federation itself, list_tools and call_tool lease
+        sessions from the server pools as they need them.
+        """
+        yield self
+
+    async def _fetch(self, prefix: str):
+        pool = self.pools[prefix]
+        started = time.monotonic()
+
+        async def list_server():
+            async with pool.lease() as session:
+                return await session.list_tools()
+
+        # a server that accepts the connection and then hangs must not pin this fetch forever
+        timeout = self.connect_timeout + self.list_timeout
+        try:
+            tools = await asyncio.wait_for(list_server(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.stale[prefix] = f"list_tools timed out after {timeout:.1f}s"
+            print(f"MCP server '{prefix}' list_tools timed out after {timeout:.1f}s")
+            return
+        except Exception as e:
+            self.stale[prefix] = f"list_tools failed: {e}"
+            print(f"MCP server '{prefix}' list_tools failed: {e}")
+            return
+        namespaced = [tool.model_copy(update={"name": f"{prefix}{SEPARATOR}{tool.name}"}) for tool in tools]
+        self.catalogs[prefix] = _ServerCatalog(namespaced, time.time())
+        elapsed = time.monotonic() - started
+        if elapsed > self.list_timeout:
+            # a consistently slow server stays stale and keeps being served from the catalog
+            self.stale[prefix] = f"list_tools took {elapsed:.1f}s"
+        else:
+            self.stale.pop(prefix, None)
+        await run_blocking(self._save_catalogs)
+
+    def _fetch_task(self, prefix: str) -> asyncio.Task:
+        # one fetch per server at a time, so a hanging server is not asked again every turn
+        task = self._fetches.get(prefix)
+        if task is None or task.done():
+            task = asyncio.create_task(self._fetch(prefix))
+            self._fetches[prefix] = task
+        return task
+
+    async def list_tools(self) -> List[Any]:
+        """the namespaced tools of every server, fresh where the server answered in time."""
+        tasks = {prefix: self._fetch_task(prefix) for prefix in self.pools}
+        # servers already known to be stale are not waited for, their fetch clears it once it succeeds
+        waiting = [task for prefix, task in tasks.items() if prefix not in self.stale]
+        if waiting:
+            await asyncio.wait(waiting, timeout=self.list_timeout)
+
+        tools: List[Any] = []
+        for prefix, task in tasks.items():
+            if not task.done():
+                self.stale[prefix] = f"list_tools took longer than {self.list_timeout}s"
+            catalog = self.catalogs.get(prefix)
+            if prefix in self.stale:
+                if catalog is None:
+                    print(f"MCP server '{prefix}' has no catalog yet ({self.stale[prefix]}), its tools are left out.")
+                    continue
+                age = time.time() - catalog.fetched_at
+                print(f"MCP server '{prefix}' is stale ({self.stale[prefix]}), serving its catalog from {age:.0f}s ago.")
+            if catalog is not None:
+                tools.extend(catalog.tools)
+        return tools
+
+    def route(self, tool_name: str) -> tuple[str, str]:
+        """(server prefix, tool name on that server) of a namespaced tool name."""
+        prefix, separator, name = tool_name.partition(SEPARATOR)
+        if not separator or prefix not in self.pools:
+            raise KeyError(f"Tool '{tool_name}' does not belong to a known MCP server")
+        return prefix, name
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]):
+        prefix, name = self.route(tool_name)
+        async with self.pools[prefix].lease() as session:
+            return await session.call_tool(name, arguments)
+
+    def stats(self) -> Dict[str, Any]:
+        servers = {}
+        for prefix, pool in self.pools.items():
+            catalog = self.catalogs.get(prefix)
+            servers[prefix] = {
+                **pool.stats(),
+                "tools": len(catalog.tools) if catalog else 0,
+                "catalog_age": time.time() - catalog.fetched_at if catalog else None,
+                "stale": self.stale.get(prefix),
+            }
+        return {"servers": servers}
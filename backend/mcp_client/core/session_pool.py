@@ -0,0 +1,183 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+from .client import MCPClient
+
+
+class _PooledClient:
+    """
+    one pooled session. its client is connected and cleaned up by the same
+    owner task, the anyio cancel scopes fastmcp enters on connect must be
+    left by the task that entered them.
+    """
+
+    def __init__(self):
+        self.client = MCPClient()
+        self.last_checked = time.monotonic()
+        self._ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._release = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def session(self):
+        return self.client.session
+
+    async def _cleanup(self):
+        try:
+            await self.client.cleanup()
+        except Exception as e:
+            print(f"session pool cleanup error: {e}")
+
+    async def _run(self, server_url: Optional[str], config: Optional[dict[str, Any]]):
+        try:
+            await self.client.connect_to_server(server_url=server_url, config=config)
+            if self.client.session is None:
+                raise ConnectionError(f"could not connect to MCP server at {server_url or config}")
+        except BaseException as e:
+            await self._cleanup()
+            if isinstance(e, asyncio.CancelledError):
+                self._ready.cancel()
+                raise
+            self._ready.set_exception(e)
+            return
+        self._ready.set_result(None)
+        try:
+            await self._release.wait()
+        finally:
+            await self._cleanup()
+
+    async def open(self, server_url: Optional[str], config: Optional[dict[str, Any]]):
+        self._task = asyncio.create_task(self._run(server_url, config))
+        try:
+            await asyncio.shield(self._ready)
+        except asyncio.CancelledError:
+            # the owner task cleans up after itself
+            self._task.cancel()
+            raise
+
+    async def close(self):
+        self._release.set()
+        if self._task is not None:
+            await self._task
+
+
+class MCPSessionPool:
+    """
+    process-wide pool of MCP sessions shared by every websocket connection.
+
+    sessions connect to `server_url`, or through a fastmcp `config` dict for
+    servers that are not reachable over http. they are opened lazily up to
+    `size`, leased with `async with pool.lease()` and returned afterwards.
+    an idle session is pinged before it is handed out again once
+    `health_check_interval` seconds have passed, and replaced if the ping
+    fails.
+    """
+
+    def __init__(
+        self,
+        server_url: Optional[str],
+        size: int = 8,
+        health_check_interval: float = 30.0,
+        config: Optional[dict[str, Any]] = None,
+    ):
+        self.server_url = server_url
+        self.config = config
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self._idle: asyncio.Queue[_PooledClient] = asyncio.Queue()
+        self._created = 0
+        self._closed = False
+
+        self.leases = 0
+        self.waits = 0
+        self.reconnects = 0
+
+    async def _open(self) -> _PooledClient:
+        entry = _PooledClient()
+        await entry.open(self.server_url, self.config)
+        return entry
+
+    async def _discard(self, entry: _PooledClient):
+        self._created -= 1
+        await entry.close()
+
+    async def _is_healthy(self, entry: _PooledClient) -> bool:
+        if time.monotonic() - entry.last_checked < self.health_check_interval:
+            return True
+        try:
+            await entry.session.ping()
+        except Exception as e:
+            print(f"session pool health check failed: {e}")
+            return False
+        entry.last_checked = time.monotonic()
+        return True
+
+    async def _acquire(self) -> _PooledClient:
+        while True:
+            if self._idle.empty():
+                if self._created < self.size:
+                    # the slot is taken before connecting, other leases do not wait on this connect
+                    self._created += 1
+                    try:
+                        return await self._open()
+                    except BaseException:
+                        self._created -= 1
+                        raise
+                self.waits += 1
+
+            entry = await self._idle.get()
+            if await self._is_healthy(entry):
+                return entry
+            self.reconnects += 1
+            await self._discard(entry)
+
+    @asynccontextmanager
+    async def lease(self):
+        """borrows a session for the duration of the block."""
+        if self._closed:
+            raise RuntimeError("session pool is closed")
+        entry = await self._acquire()
+        self.leases += 1
+        failed = False
+        try:
+            yield entry.session
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self._closed:
+                await self._discard(entry)
+            else:
+                if failed:
+                    # force a ping before the next lease
+                    entry.last_checked = 0.0
+                self._idle.put_nowait(entry)
+
+    async def start(self, warm: Optional[int] = None):
+        """opens up to `warm` sessions ahead of the first request."""
+        count = min(self.size, self.size if warm is None else warm)
+        results = await asyncio.gather(*(self._open() for _ in range(count)), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                print(f"session pool warm-up failed: {result}")
+                continue
+            self._created += 1
+            self._idle.put_nowait(result)
+        print(f"MCP session pool ready with {self._idle.qsize()}/{self.size} sessions.")
+
+    async def close(self):
+        self._closed = True
+        while not self._idle.empty():
+            await self._discard(self._idle.get_nowait())
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "size": self.size,
+            "open": self._created,
+            "idle": self._idle.qsize(),
+            "leases": self.leases,
+            "waits": self.waits,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,171 @@
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional
+
+
+class MessageLog:
+    """
+    bounded replay buffer of the events sent for one assistant message.
+
+    consecutive text chunks of a part are stored as one entry with the
+    text offset reached at each seq, so a long answer takes one entry per
+    part and a client can resume from the middle of a chunk run.
+
+    an `end` event carrying `next` names the message the turn goes on
+    with, a resume follows it.
+    """
+
+    def __init__(self, channel: "StreamChannel", max_entries: int = 2000):
+        self.channel = channel
+        self.next_message_id: Optional[str] = None
+        self.next_seq = 0
+        self.evicted_through = -1
+        self._entries: Deque[Dict[str, Any]] = deque()
+        self.max_entries = max_entries
+
+    def append(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        seq = self.next_seq
+        self.next_seq += 1
+        message = {**message, "seq": seq}
+        if message.get("type") == "end":
+            self.next_message_id = message.get("next")
+
+        last = self._entries[-1] if self._entries else None
+        if (
+            last is not None
+            and message.get("type") == "text_chunk"
+            and last["event"].get("type") == "text_chunk"
+            and last["event"].get("partIndex") == message.get("partIndex")
+        ):
+            event = last["event"]
+            event["text"] += message.get("text", "")
+            if "status" in message:
+                event["status"] = message["status"]
+            event["seq"] = seq
+            last["marks"].append((seq, len(event["text"])))
+            return message
+
+        entry = {"first": seq, "event": dict(message), "marks": None}
+        if message.get("type") == "text_chunk":
+            entry["marks"] = [(seq, len(message.get("text", "")))]
+        self._entries.append(entry)
+        while len(self._entries) > self.max_entries:
+            self.evicted_through = self._entries.popleft()["event"]["seq"]
+        return message
+
+    def after(self, last_seq: int) -> Optional[List[Dict[str, Any]]]:
+        """events with a seq above last_seq, or None if some were already evicted."""
+        if last_seq < self.evicted_through:
+            return None
+        events = []
+        for entry in self._entries:
+            event = entry["event"]
+            if event["seq"] <= last_seq:
+                continue
+            if entry["first"] > last_seq:
+                events.append(dict(event))
+                continue
+            # the client stopped inside a merged text run, send only the rest
+            offset = next(end for seq, end in reversed(entry["marks"]) if seq <= last_seq)
+            events.append({**event, "text": event["text"][offset:]})
+        return events
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StreamChannel:
+    """
+    what an orchestrator sends its events through.
+
+    every event with a messageId gets the next seq of that message and is
+    recorded in the registry before it is forwarded to the connection's
+    writer. while the connection is gone the channel is detached and events
+    are only recorded, so generation can go on and be resumed later.
+    `streaming` is the message between its start and end, if any.
+    """
+
+    def __init__(self, writer, registry: "StreamRegistry", owner: Any = None):
+        self.writer = writer
+        self.registry = registry
+        self.owner = owner
+        self.streaming: Optional[str] = None
+
+    async def send_json(self, message: Dict[str, Any]):
+        if message.get("messageId"):
+            message = self.registry.record(self, message)
+            if message.get("type") == "start":
+                self.streaming = message["messageId"]
+            elif message.get("type") == "end" and self.streaming == message["messageId"]:
+                self.streaming = message.get("next")
+        writer = self.writer
+        if writer is not None:
+            await writer.send_json(message)
+
+    def attach(self, writer):
+        self.writer = writer
+
+    def detach(self):
+        self.writer = None
+
+
+class StreamRegistry:
+    """process-wide replay buffers of the most recent `max_messages` messages."""
+
+    def __init__(self, max_messages: int = 256, max_events: int = 2000):
+        self.max_messages = max_messages
+        self.max_events = max_events
+        self._logs: OrderedDict[str, MessageLog] = OrderedDict()
+
+    def record(self, channel: StreamChannel, message: Dict[str, Any]) -> Dict[str, Any]:
+        message_id = message["messageId"]
+        log = self._logs.get(message_id)
+        if log is None:
+            log = MessageLog(channel, self.max_events)
+            self._logs[message_id] = log
+            while len(self._logs) > self.max_messages:
+                self._logs.popitem(last=False)
+        else:
+            self._logs.move_to_end(message_id)
+        return log.append(message)
+
+    def get(self, message_id: str) -> Optional[MessageLog]:
+        return self._logs.get(message_id)
+
+    async def resume(self, message_id: str, last_seq: int, writer) -> bool:
+        """
+        sends the events after last_seq to writer, then every message the
+        turn went on with, then switches the channel over to writer for the
+        live tail. returns False if the message is unknown or its buffer no
+        longer reaches back to last_seq.
+        """
+        log = self._logs.get(message_id)
+        if log is None:
+            return False
+        # events recorded while replaying are picked up by the next pass
+        log.channel.detach()
+        seq = last_seq
+        try:
+            while True:
+                events = log.after(seq)
+                if events is None:
+                    return False
+                if not events:
+                    # a tool round ended the message, the turn went on under the next one
+                    following = self._logs.get(log.next_message_id) if log.next_message_id else None
+                    if following is None:
+                        return True
+                    log, seq = following, -1
+                    log.channel.detach()
+                    continue
+                for event in events:
+                    await writer.send_json(event)
+                    seq = event["seq"]
+        finally:
+            # later messages of the chat stream to the new connection either way
+            log.channel.attach(writer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "messages": len(self._logs),
+            "entries": sum(len(log) for log in self._logs.values()),
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from ..utils.serializer import EventSerializer
+
+
+def _is_status(message: Dict[str, Any]) -> bool:
+    """log and status-only messages can be dropped when a client falls behind."""
+    return message.get("type") == "log" or set(message) == {"log"}
+
+
+class StreamWriter:
+    """
+    outbound queue for one websocket connection, drained by a single
+    writer task so nothing else ever writes to the socket directly.
+
+    consecutive text_chunk events for the same message and part are merged
+    and sent once flush_interval_ms has passed or flush_bytes of text have
+    accumulated. any other event flushes the pending text first, so part
+    boundaries, tool events and 'end' always arrive in order.
+
+    the queue holds at most max_queue events. when it is full, pending text
+    chunks are merged, then stale log/status messages are dropped, and only
+    then does send_json wait for the writer to make room.
+
+    events are encoded by `serializer`, which picks the JSON encoder and
+    whether frames go out as text or binary.
+    """
+
+    def __init__(self, websocket, flush_interval_ms: float = 30.0, flush_bytes: int = 1024, max_queue: int = 256, serializer: Optional[EventSerializer] = None):
+        self.websocket = websocket
+        self.serializer = serializer or EventSerializer()
+        self.flush_interval = flush_interval_ms / 1000
+        self.flush_bytes = flush_bytes
+        self.max_queue = max_queue
+        self._queue: Deque[Tuple[Dict[str, Any], float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+
+        self.events_in = 0
+        self.frames_out = 0
+        self.merged = 0
+        self.dropped = 0
+        self.backpressure_waits = 0
+        self.max_depth = 0
+
+    @staticmethod
+    def _can_merge(pending: Dict[str, Any], message: Dict[str, Any]) -> bool:
+        return (
+            pending.get("type") == "text_chunk"
+            and message.get("type") == "text_chunk"
+            and pending.get("messageId") == message.get("messageId")
+            and pending.get("partIndex") == message.get("partIndex")
+        )
+
+    def _merge(self, pending: Dict[str, Any], message: Dict[str, Any]):
+        pending["text"] += message.get("text", "")
+        if "status" in message:
+            pending["status"] = message["status"]
+        if "seq" in message:
+            pending["seq"] = message["seq"]
+        self.merged += 1
+
+    async def send_json(self, message: Dict[str, Any]):
+        if self.closed:
+            self.dropped += 1
+            return
+        self.events_in += 1
+        self._ensure_task()
+
+        if self._queue and self._can_merge(self._queue[-1][0], message):
+            pending = self._queue[-1][0]
+            self._merge(pending, message)
+            if len(pending["text"].encode("utf-8")) >= self.flush_bytes:
+                self._wakeup.set()
+            return
+
+        while len(self._queue) >= self.max_queue:
+            self._compact()
+            if len(self._queue) < self.max_queue:
+                break
+            if _is_status(message):
+                self.dropped += 1
+                return
+            self.backpressure_waits += 1
+            self._space.clear()
+            await self._space.wait()
+            if self.closed:
+                self.dropped += 1
+                return
+
+        if message.get("type") == "text_chunk":
+            message = dict(message)
+        self._queue.append((message, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self._queue))
+        self._idle.clear()
+        self._wakeup.set()
+
+    def _compact(self):
+        compacted: Deque[Tuple[Dict[str, Any], float]] = deque()
+        for item in self._queue:
+            if compacted and self._can_merge(compacted[-1][0], item[0]):
+                self._merge(compacted[-1][0], item[0])
+                continue
+            compacted.append(item)
+        self._queue = compacted
+        if len(self._queue) < self.max_queue:
+            return
+
+        # newer events supersede queued log/status updates
+        before = len(self._queue)
+        self._queue = deque(item for item in self._queue if not _is_status(item[0]))
+        self.dropped += before - len(self._queue)
+
+    def _ensure_task(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            message, queued_at = self._queue[0]
+            if message.get("type") == "text_chunk" and len(self._queue) == 1:
+                # give the next deltas a chance to join this chunk
+                remaining = queued_at + self.flush_interval - time.monotonic()
+                if remaining > 0 and len(message["text"].encode("utf-8")) < self.flush_bytes:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+            self._queue.popleft()
+            self._space.set()
+            try:
+                await self.serializer.send(self.websocket, message)
+                self.frames_out += 1
+            except Exception as e:
+                print(f"stream writer stopped: {e}")
+                self._shutdown()
+                return
+
+    def _shutdown(self):
+        self.closed = True
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        self._space.set()
+        self._idle.set()
+
+    async def flush(self):
+        """waits until every queued event has been written."""
+        if self._queue:
+            self._wakeup.set()
+        await self._idle.wait()
+
+    async def close(self):
+        self._shutdown()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": len(self._queue),
+            "max_depth": self.max_depth,
+            "events_in": self.events_in,
+            "frames_out": self.frames_out,
+            "merged": self.merged,
+            "dropped": self.dropped,
+            "backpressure_waits": self.backpressure_waits,
+            "closed": self.closed,
+        }
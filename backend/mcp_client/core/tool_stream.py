@@ -0,0 +1,80 @@
+import json
+import uuid
+from typing import Any, Dict, List, Tuple
+
+
+class ToolCallAssembler:
+    """
+    assembles streamed tool-call deltas into complete calls.
+
+    a call is complete as soon as its name is known and its accumulated
+    arguments parse as a JSON object, so it can be dispatched while the
+    rest of the response is still streaming. calls that never parse are
+    released by finish() when the stream ends.
+    """
+
+    def __init__(self):
+        self.calls: Dict[Any, Dict[str, Any]] = {}
+        self.completed: set = set()
+
+    def feed(self, tool_call_deltas) -> List[Tuple[str, Any, Dict[str, Any]]]:
+        """
+        consumes the tool_calls of one delta and returns events in order:
+        ("new", key, call), ("arguments", key, call) and ("complete", key, call).
+        """
+        events: List[Tuple[str, Any, Dict[str, Any]]] = []
+        for tool in tool_call_deltas or []:
+            key = tool.index
+            if key is None:
+                # providers that omit the index send the whole call at once
+                key = uuid.uuid1()
+
+            call = self.calls.get(key)
+            is_new = call is None
+            if is_new:
+                call = {"id": None, "name": "", "arguments": ""}
+                self.calls[key] = call
+                # a new index means the previous calls have finished streaming
+                events.extend(self._release(exclude=key))
+                events.append(("new", key, call))
+
+            if tool.id:
+                call["id"] = tool.id
+            function = tool.function
+            if function is not None:
+                if function.name:
+                    call["name"] = function.name
+                if function.arguments:
+                    call["arguments"] += function.arguments
+                    if not is_new:
+                        events.append(("arguments", key, call))
+
+            if key not in self.completed and self._is_complete(call):
+                events.append(self._complete(key, call))
+        return events
+
+    def finish(self) -> List[Tuple[str, Any, Dict[str, Any]]]:
+        """releases every call that has not been reported complete yet."""
+        return self._release()
+
+    def _release(self, exclude: Any = None):
+        return [
+            self._complete(key, call)
+            for key, call in self.calls.items()
+            if key != exclude and key not in self.completed
+        ]
+
+    def _complete(self, key: Any, call: Dict[str, Any]):
+        self.completed.add(key)
+        if not call["id"]:
+            call["id"] = str(uuid.uuid4())
+        return ("complete", key, call)
+
+    @staticmethod
+    def _is_complete(call: Dict[str, Any]) -> bool:
+        if not call["name"] or not call["arguments"]:
+            return False
+        try:
+            return isinstance(json.loads(call["arguments"]), dict)
+        except ValueError:
+            return False
@@ -0,0 +1,86 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+
+
+class ToolUpdateEncoder:
+    """
+    turns successive states of a tool part into compact websocket events.
+
+    the first state of a part goes out as a full content_part_start with
+    version 0. every later state is a tool_update carrying only what changed:
+    `set` for replaced fields and `append` for string fields that only grew,
+    like streamed arguments. versions increase by one per part so the browser
+    can ignore anything it has already applied.
+    """
+
+    def __init__(self):
+        self._sent: Dict[Tuple[str, int], Tuple[int, Dict[str, Any]]] = {}
+
+    def reset(self):
+        self._sent.clear()
+
+    def encode(self, part_message: Dict[str, Any], part_index: int, tool: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """returns the event for the new state of a tool part, or None if nothing changed."""
+        message_id = part_message.get("messageId")
+        key = (message_id, part_index)
+        state = dict(tool)
+        previous = self._sent.get(key)
+        if previous is None:
+            self._sent[key] = (0, state)
+            return {**part_message, "partIndex": part_index, "version": 0, "part": {"tool": dict(state)}}
+
+        version, sent = previous
+        changed: Dict[str, Any] = {}
+        appended: Dict[str, str] = {}
+        for field, value in state.items():
+            old = sent.get(field)
+            if field in sent and old == value:
+                continue
+            if isinstance(old, str) and old and isinstance(value, str) and value.startswith(old):
+                appended[field] = value[len(old):]
+            else:
+                changed[field] = value
+        if not changed and not appended:
+            return None
+
+        version += 1
+        self._sent[key] = (version, state)
+        update: Dict[str, Any] = {
+            "type": "tool_update",
+            "messageId": message_id,
+            "partIndex": part_index,
+            "version": version,
+        }
+        if changed:
+            update["set"] = changed
+        if appended:
+            update["append"] = appended
+        return update
+
+
+if __name__ == "__main__":
+    # outbound bytes for one tool call with large streamed arguments
+    arguments = json.dumps({"query": "select * from events where " + " or ".join(f"id = {i}" for i in range(2000))})
+    output = "row " * 12000
+    deltas = [arguments[i:i + 100] for i in range(0, len(arguments), 100)]
+    part_message = {"type": "content_part_start", "chatId": "chat", "messageId": "message", "partIndex": 0, "part": {"text": ""}}
+
+    states = []
+    tool = {"id": "call_1", "name": "run_sql", "input": "", "output": "", "state": "input-streaming"}
+    for delta in deltas:
+        tool["input"] += delta
+        states.append(dict(tool))
+    tool["state"] = "input-available"
+    states.append(dict(tool))
+    tool["state"] = "output-available"
+    tool["output"] = output
+    states.append(dict(tool))
+
+    full = sum(len(json.dumps({**part_message, "part": {"tool": state}})) for state in states)
+    encoder = ToolUpdateEncoder()
+    events = [encoder.encode(part_message, 0, state) for state in states]
+    delta = sum(len(json.dumps(event)) for event in events if event is not None)
+
+    print(f"arguments: {len(arguments)} bytes in {len(deltas)} deltas, output: {len(output)} bytes")
+    print(f"full tool objects: {full} bytes")
+    print(f"tool_update deltas: {delta} bytes ({full / delta:.1f}x smaller)")
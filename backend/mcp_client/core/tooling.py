@@ -1,3 +1,5 @@
+import hashlib
+import json
 from typing import Any, Dict, List
 
 
@@ -55,3 +57,155 @@ def build_available_tools(mcp_tools_list: List[Any], chosen_names: List[str], cu
     return available + list(custom_tools)
 
 
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 3].rstrip() + "..."
+
+
+def compact_schema(schema: Any, description_chars: int) -> Any:
+    """
+    drops what the model does not need from a JSON schema: titles, null
+    defaults, the null branch of optional fields and descriptions past
+    description_chars.
+    """
+    if isinstance(schema, list):
+        return [compact_schema(item, description_chars) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+
+    compact: Dict[str, Any] = {}
+    for key, value in schema.items():
+        if key == "title" and isinstance(value, str):
+            continue
+        if key == "default" and value is None:
+            continue
+        if key == "description" and isinstance(value, str):
+            compact[key] = _truncate(value, description_chars)
+            continue
+        if key == "properties" and isinstance(value, dict):
+            # property names are not schema keywords, keep them all
+            compact[key] = {name: compact_schema(prop, description_chars) for name, prop in value.items()}
+            continue
+        compact[key] = compact_schema(value, description_chars)
+
+    # optional fields come as anyOf [<type>, null], the null branch adds nothing
+    variants = compact.get("anyOf")
+    if isinstance(variants, list) and len(variants) == 2 and {"type": "null"} in variants:
+        other = variants[0] if variants[1] == {"type": "null"} else variants[1]
+        del compact["anyOf"]
+        compact = {**other, **compact}
+    return compact
+
+
+_compact_tools: Dict[str, Dict[str, Any]] = {}
+_MAX_COMPACT_TOOLS = 4096
+
+
+def compact_tool(tool: Any, description_chars: int) -> Dict[str, Any]:
+    """
+    function definition of an mcp tool with a compacted schema, built once
+    per distinct tool and cached by a hash of its full definition.
+    """
+    source = json.dumps(
+        [tool.name, tool.description, tool.inputSchema, description_chars], sort_keys=True, default=str
+    )
+    key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+    cached = _compact_tools.get(key)
+    if cached is None:
+        cached = {
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": _truncate(tool.description or "", description_chars),
+                "parameters": compact_schema(tool.inputSchema or {"type": "object", "properties": {}}, description_chars),
+            },
+        }
+        _compact_tools[key] = cached
+        while len(_compact_tools) > _MAX_COMPACT_TOOLS:
+            del _compact_tools[next(iter(_compact_tools))]
+    return cached
+
+
+def estimate_tool_tokens(tool: Dict[str, Any]) -> int:
+    return len(json.dumps(tool, separators=(",", ":"), default=str)) // 4
+
+
+def select_tools(
+    mcp_tools_list: List[Any],
+    ranked: List[Any],
+    custom_tools: List[Dict[str, Any]],
+    budget_tokens: int,
+    description_chars: int,
+) -> List[Dict[str, Any]]:
+    """
+    packs compacted mcp tools into budget_tokens, best match first.
+
+    ranked holds tool names nearest first or (name, distance) pairs. custom
+    tools are always included and count against the budget. a tool that does
+    not fit is skipped, smaller ones further down may still fit.
+    """
+    if ranked and isinstance(ranked[0], (tuple, list)):
+        names = [name for name, _ in sorted(ranked, key=lambda pair: pair[1])]
+    else:
+        names = list(ranked)
+    by_name = {tool.name: tool for tool in mcp_tools_list}
+
+    selected = list(custom_tools)
+    used = sum(estimate_tool_tokens(tool) for tool in selected)
+    skipped = []
+    for name in dict.fromkeys(names):
+        tool = by_name.get(name)
+        if tool is None:
+            continue
+        compact = compact_tool(tool, description_chars)
+        cost = estimate_tool_tokens(compact)
+        if used + cost > budget_tokens:
+            skipped.append(name)
+            continue
+        selected.append(compact)
+        used += cost
+    if skipped:
+        print(f"tool budget of {budget_tokens} tokens reached, left out: {skipped}")
+    return selected
+
+
+class ToolOrder:
+    """
+    keeps the tool block of a chat in a stable order across turns.
+
+    pinned tools (the custom ones) always come first, every other tool keeps
+    the position it got the first time it was offered and newly seen tools
+    are appended at the end, sorted by name. schemas are serialized with
+    sorted keys. together this keeps the system prompt plus tool block a
+    stable prefix that providers can cache.
+    """
+
+    def __init__(self, pinned: List[str] | None = None):
+        self.pinned = list(pinned or [])
+        self._rank: Dict[str, int] = {}
+        self._canonical: Dict[str, tuple[str, Dict[str, Any], Dict[str, Any]]] = {}
+
+    def _canonicalize(self, tool: Dict[str, Any]) -> Dict[str, Any]:
+        name = tool["function"]["name"]
+        cached = self._canonical.get(name)
+        # compacted tools are cached objects, so the same object means the same schema
+        if cached is not None and cached[2] is tool:
+            return cached[1]
+        encoded = json.dumps(tool, sort_keys=True, default=str)
+        if cached is None or cached[0] != encoded:
+            cached = (encoded, json.loads(encoded), tool)
+        else:
+            cached = (cached[0], cached[1], tool)
+        self._canonical[name] = cached
+        return cached[1]
+
+    def arrange(self, tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        by_name = {tool["function"]["name"]: tool for tool in tools}
+        for name in sorted(name for name in by_name if name not in self._rank and name not in self.pinned):
+            self._rank[name] = len(self._rank)
+
+        pinned = [name for name in self.pinned if name in by_name]
+        rest = sorted((name for name in by_name if name not in self.pinned), key=self._rank.__getitem__)
+        return [self._canonicalize(by_name[name]) for name in pinned + rest]
@@ -0,0 +1,58 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict
+
+
+def read_usage(usage) -> Dict[str, int]:
+    """prompt, cached and completion tokens from an openai-style usage object."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+    }
+
+
+class UsageTracker:
+    """
+    records prompt tokens per turn, split into cached and uncached, so the
+    prompt cache hit rate can be followed over time. keeps running totals
+    and the most recent `history` turns.
+    """
+
+    def __init__(self, history: int = 500):
+        self.turns: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.requests = 0
+
+    def record(self, chat_id: str, usage: Dict[str, int], requests: int):
+        self.prompt_tokens += usage["prompt_tokens"]
+        self.cached_tokens += usage["cached_tokens"]
+        self.completion_tokens += usage["completion_tokens"]
+        self.requests += requests
+        turn = {
+            "at": time.time(),
+            "chatId": chat_id,
+            "requests": requests,
+            **usage,
+            "uncached_tokens": usage["prompt_tokens"] - usage["cached_tokens"],
+        }
+        self.turns.append(turn)
+        hit_rate = usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+        print(
+            f"turn usage: {usage['prompt_tokens']} prompt tokens ({usage['cached_tokens']} cached, "
+            f"{hit_rate:.0%}), {usage['completion_tokens']} completion tokens"
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "uncached_tokens": self.prompt_tokens - self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cache_hit_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            "recent_turns": list(self.turns),
+        }
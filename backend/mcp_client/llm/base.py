@@ -11,6 +11,9 @@ class LLMProvider:
     def generate(self, system: str, messages: list[dict[str, Any]], tools: list[dict], **kwargs) -> Any:
         raise NotImplementedError
 
+    async def complete(self, system: str, messages: list[dict[str, Any]], **kwargs) -> str:
+        raise NotImplementedError
+
     def get_model(self, provider: str, model: str, creds: dict[str, Any]):
         models = {
                 "GOOGLE":GoogleModel(model,provider=GoogleProvider(api_key=creds.get("api_key"))),
@@ -30,6 +30,8 @@ class OpenAIProvider(LLMProvider):
                 tool_choice="auto",
                 reasoning_effort="low",
                 stream=True,
+                # the final chunk reports prompt tokens, including cached ones
+                stream_options={"include_usage": True},
                 extra_body={
                   'extra_body': {
                     "google": {
@@ -42,7 +44,6 @@ class OpenAIProvider(LLMProvider):
                 }
             )
             async for chunk in stream:
-                print(chunk.choices[0].delta.content)
                 yield chunk
 
         except APIConnectionError as e:
@@ -51,6 +52,25 @@ class OpenAIProvider(LLMProvider):
             last_error = e
             await asyncio.sleep(3)
 
+    async def complete(
+        self,
+        system: str,
+        messages: list[dict[str, Any]],
+        model: str = "gemini-2.5-flash",
+        temperature: float = 0.2,
+    ) -> str:
+        """single non-streaming completion without tools, returns the text."""
+        conversations = [{"role": "system", "content": system}] + list(messages)
+        response = await self.client.chat.completions.create(
+            model=model,
+            temperature=temperature,
+            messages=conversations,
+            reasoning_effort="low",
+        )
+        if not response.choices:
+            return ""
+        return response.choices[0].message.content or ""
+
 
 if "__main__" == __name__:
     OpenAIProvider()
@@ -0,0 +1,378 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+_DTYPES = {"float16": np.float16, "int8": np.int8}
+# coarse rows converted to float32 at a time when scoring, bounds the per-query allocation
+_SCORE_BLOCK = 4096
+
+
+@contextmanager
+def _file_lock(path: str):
+    """exclusive lock on `path` across processes and threads."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def truncate_normalize(matrix: np.ndarray, dim: int) -> np.ndarray:
+    """
+    first `dim` components of each row, renormalized. gemini embeddings are
+    trained so a prefix is a valid lower dimensional embedding, this is what
+    the API returns for a reduced output_dimensionality.
+    """
+    prefix = np.asarray(matrix, dtype=np.float32)[..., :dim]
+    norms = np.linalg.norm(prefix, axis=-1, keepdims=True)
+    return prefix / np.where(norms == 0, 1.0, norms)
+
+
+class CompactVectorStore:
+    """
+    tool vectors on disk, memory mapped read-only.
+
+    each write creates a new generation directory holding
+      full.f32     the full precision vectors, only rows being re-ranked are read
+      coarse.bin   truncated, normalized vectors as float16 or int8
+      scales.f32   per-row int8 scales
+      meta.json    ids, names, documents and the embedding backend
+    and then atomically points `current` at it. mapped pages live in the OS
+    page cache, so every uvicorn worker reading the same path shares one copy,
+    and a worker notices another worker's write on its next query.
+
+    writers take a file lock, and append merges into the latest generation
+    under it, so workers adding tools at once never drop each other's rows.
+    generations younger than `prune_after` seconds are kept for readers that
+    read the pointer before it moved.
+
+    a query scores all coarse vectors in blocks of _SCORE_BLOCK rows, then
+    computes exact squared L2 distances for the best rerank_k of them.
+    """
+
+    prune_after = 60.0
+
+    def __init__(self, root: str, dim: int = 256, dtype: str = "int8", rerank_k: int = 100):
+        if dtype not in _DTYPES:
+            raise ValueError(f"unsupported compact dtype '{dtype}', expected one of {sorted(_DTYPES)}.")
+        self.root = root
+        self.dim = dim
+        self.dtype = dtype
+        self.rerank_k = rerank_k
+        self.generation: str | None = None
+        self.ids: list[str] = []
+        self.names: list[str] = []
+        self.documents: list[str] = []
+        self.backend: str | None = None
+        self._full = None
+        self._coarse = None
+        self._scales = None
+        self._lock = threading.Lock()
+
+    @property
+    def _pointer(self) -> str:
+        return os.path.join(self.root, "current")
+
+    def _current_generation(self) -> str | None:
+        try:
+            with open(self._pointer, "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        return _file_lock(os.path.join(self.root, "lock"))
+
+    def write(self, ids: list[str], names: list[str], embeddings, documents: list[str], backend: str | None):
+        """writes a new generation and makes it current."""
+        with self._locked():
+            self._write(ids, names, embeddings, documents, backend)
+
+    def append(self, ids: list[str], names: list[str], embeddings, documents: list[str], backend: str | None) -> int:
+        """
+        adds the rows whose ids the latest generation does not hold yet,
+        including rows other writers added since this store was opened.
+        returns the number of rows added.
+        """
+        with self._locked():
+            self.open()
+            with self._lock:
+                current_ids, current_names, current_documents = self.ids, self.names, self.documents
+                current_full, current_backend = self._full, self.backend
+            known = set(current_ids)
+            fresh = list({tool_id: i for i, tool_id in enumerate(ids) if tool_id not in known}.values())
+            if not fresh:
+                return 0
+            if current_ids and current_backend and backend and current_backend != backend:
+                raise ValueError(f"cannot add '{backend}' embeddings to a store of '{current_backend}' embeddings.")
+
+            full = np.asarray([embeddings[i] for i in fresh], dtype=np.float32)
+            if len(current_ids):
+                full = np.concatenate([np.asarray(current_full), full])
+            self._write(
+                list(current_ids) + [ids[i] for i in fresh],
+                list(current_names) + [names[i] for i in fresh],
+                full,
+                list(current_documents) + [documents[i] for i in fresh],
+                (current_backend if current_ids else None) or backend,
+            )
+            return len(fresh)
+
+    def _write(self, ids: list[str], names: list[str], embeddings, documents: list[str], backend: str | None):
+        full = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+        if full.ndim != 2 or not len(full):
+            raise ValueError("compact store needs a non-empty 2d embedding matrix.")
+        dim = min(self.dim, full.shape[1])
+        coarse = truncate_normalize(full, dim)
+
+        generation = f"{time.time_ns():x}-{uuid.uuid4().hex[:8]}"
+        directory = os.path.join(self.root, generation)
+        os.makedirs(directory)
+        full.tofile(os.path.join(directory, "full.f32"))
+        if self.dtype == "int8":
+            scales = np.abs(coarse).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(coarse / scales[:, None]).astype(np.int8)
+            codes.tofile(os.path.join(directory, "coarse.bin"))
+            scales.astype(np.float32).tofile(os.path.join(directory, "scales.f32"))
+        else:
+            coarse.astype(np.float16).tofile(os.path.join(directory, "coarse.bin"))
+        meta = {
+            "count": len(full),
+            "full_dim": full.shape[1],
+            "dim": dim,
+            "dtype": self.dtype,
+            "backend": backend,
+            "ids": list(ids),
+            "names": list(names),
+            "documents": list(documents),
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+        tmp_pointer = f"{self._pointer}.{uuid.uuid4().hex}"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(generation)
+        os.replace(tmp_pointer, self._pointer)
+        self._prune(keep={generation, self.generation})
+        self.open()
+
+    def _prune(self, keep: set):
+        # mapped files stay readable after unlink, recent generations are kept
+        # for readers that read the pointer but have not mapped it yet
+        cutoff = time.time_ns() - int(self.prune_after * 1e9)
+        for entry in os.listdir(self.root):
+            path = os.path.join(self.root, entry)
+            if entry in keep or not os.path.isdir(path):
+                continue
+            try:
+                written = int(entry.split("-", 1)[0], 16)
+            except ValueError:
+                continue
+            if written < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def open(self) -> bool:
+        """maps the current generation, returns False when there is none."""
+        for attempt in range(3):
+            generation = self._current_generation()
+            if generation is None:
+                return False
+            try:
+                self._map(generation)
+                return True
+            except FileNotFoundError:
+                # pruned between reading the pointer and mapping it, the pointer has moved on since
+                if attempt == 2:
+                    raise
+        return False
+
+    def _map(self, generation: str):
+        directory = os.path.join(self.root, generation)
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        count, full_dim, dim = meta["count"], meta["full_dim"], meta["dim"]
+        full = np.memmap(os.path.join(directory, "full.f32"), dtype=np.float32, mode="r", shape=(count, full_dim))
+        coarse = np.memmap(
+            os.path.join(directory, "coarse.bin"), dtype=_DTYPES[meta["dtype"]], mode="r", shape=(count, dim)
+        )
+        scales = None
+        if meta["dtype"] == "int8":
+            scales = np.fromfile(os.path.join(directory, "scales.f32"), dtype=np.float32)
+
+        with self._lock:
+            self.generation = generation
+            self.ids, self.names, self.documents = meta["ids"], meta["names"], meta["documents"]
+            self.backend = meta["backend"]
+            self._full, self._coarse, self._scales = full, coarse, scales
+
+    def changed(self) -> bool:
+        """true when another writer made a different generation current."""
+        return self._current_generation() != self.generation
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def resident_bytes(self) -> int:
+        """bytes scanned on every query, the coarse vectors and their scales."""
+        coarse = self._coarse.nbytes if self._coarse is not None else 0
+        scales = self._scales.nbytes if self._scales is not None else 0
+        return coarse + scales
+
+    def snapshot(self) -> dict:
+        """the mapped generation as one consistent view, see query."""
+        with self._lock:
+            return {
+                "generation": self.generation,
+                "ids": self.ids,
+                "names": self.names,
+                "documents": self.documents,
+                "backend": self.backend,
+                "full": self._full,
+                "coarse": self._coarse,
+                "scales": self._scales,
+            }
+
+    def embeddings(self) -> np.ndarray:
+        """the full precision vectors of the current generation."""
+        with self._lock:
+            full = self._full
+        return full if full is not None else np.empty((0, 0), dtype=np.float32)
+
+    def query(
+        self, query_embedding, n_results: int = 100, mask: np.ndarray | None = None, view: dict | None = None
+    ) -> list[tuple[str, float]]:
+        """
+        returns up to n_results (tool_name, distance) pairs nearest first,
+        distances are exact squared L2 over the full precision vectors.
+        with a boolean mask only the selected rows are considered. a mask
+        built for an earlier snapshot must be passed with that snapshot as
+        `view`, the store may have mapped another generation since.
+        """
+        view = view or self.snapshot()
+        full, coarse, scales, names = view["full"], view["coarse"], view["scales"], view["names"]
+        if coarse is None or not len(names):
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_prefix = truncate_normalize(query, coarse.shape[1])
+        scores = np.empty(len(coarse), dtype=np.float32)
+        for start in range(0, len(coarse), _SCORE_BLOCK):
+            block = np.asarray(coarse[start:start + _SCORE_BLOCK], dtype=np.float32)
+            np.dot(block, query_prefix, out=scores[start:start + len(block)])
+        if scales is not None:
+            scores *= scales
+        allowed = len(names)
+        if mask is not None:
+            scores[~mask] = -np.inf
+            allowed = int(mask.sum())
+
+        k = min(max(self.rerank_k, n_results), allowed)
+        if not k:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k] if k < len(names) else np.arange(len(names))
+        candidates.sort()
+        # fancy indexing a memmap reads only the candidate rows
+        rows = np.asarray(full[candidates])
+        distances = np.einsum("ij,ij->i", rows, rows) - 2.0 * (rows @ query) + float(query @ query)
+
+        order = np.argsort(distances, kind="stable")[:n_results]
+        return [(names[candidates[i]], float(distances[i])) for i in order]
+
+
+if __name__ == "__main__":
+    # retrieval benchmark against the full precision ToolIndex path.
+    #   python -m mcp_client.rag.compact_store [chroma_path] [collection]
+    # uses the cached catalog when chromadb and the collection are available,
+    # otherwise synthetic embeddings whose energy falls off with the dimension
+    # like a matryoshka trained model.
+    import sys
+    import tempfile
+
+    vectors = None
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "./chroma_db"
+    collection_name = sys.argv[2] if len(sys.argv) > 2 else "cached_tools"
+    try:
+        import chromadb
+
+        collection = chromadb.PersistentClient(path=db_path).get_collection(collection_name)
+        vectors = np.asarray(collection.get(include=["embeddings"])["embeddings"], dtype=np.float32)
+        print(f"using {len(vectors)} vectors from '{collection_name}'")
+    except Exception as e:
+        print(f"no cached catalog ({e.__class__.__name__}), using synthetic vectors")
+
+    rng = np.random.default_rng(0)
+    if vectors is None or len(vectors) < 50:
+        count, full_dim = 5000, 3072
+        decay = 1.0 / np.sqrt(1.0 + np.arange(full_dim) / 64.0)
+        centers = rng.standard_normal((200, full_dim)).astype(np.float32) * decay
+        vectors = centers[rng.integers(0, 200, count)] + 0.6 * rng.standard_normal((count, full_dim)).astype(np.float32) * decay
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    # queries sit between a tool and unrelated noise, a nearest neighbour still has close competitors
+    noise = rng.standard_normal((200, vectors.shape[1])).astype(np.float32)
+    noise /= np.linalg.norm(noise, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, len(vectors), 200)] + noise
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    names = [f"tool_{i}" for i in range(len(vectors))]
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    def exact(query, k):
+        distances = sq_norms - 2.0 * (vectors @ query) + float(query @ query)
+        return [names[i] for i in np.argsort(distances)[:k]]
+
+    start = time.perf_counter()
+    for query in queries:
+        exact(query, 10)
+    full_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"\nfull precision   {vectors.nbytes / 1e6:8.2f} MB in memory, {full_ms:6.3f} ms/query")
+
+    with tempfile.TemporaryDirectory() as root:
+        for dtype in ("float16", "int8"):
+            for dim in (128, 256, 768):
+                store = CompactVectorStore(os.path.join(root, f"{dtype}-{dim}"), dim=dim, dtype=dtype)
+                os.makedirs(store.root)
+                store.write(names, names, vectors, [""] * len(names), "bench")
+
+                for rerank_k in (10, 50):
+                    reader = CompactVectorStore(store.root, dim=dim, dtype=dtype, rerank_k=rerank_k)
+                    start = time.perf_counter()
+                    reader.open()
+                    load_ms = (time.perf_counter() - start) * 1000
+
+                    hits = {1: 0, 10: 0}
+                    start = time.perf_counter()
+                    results = [reader.query(query, 10) for query in queries]
+                    query_ms = (time.perf_counter() - start) * 1000 / len(queries)
+                    for query, result in zip(queries, results):
+                        got = [name for name, _ in result]
+                        truth = exact(query, 10)
+                        hits[1] += got[0] == truth[0]
+                        hits[10] += len(set(got) & set(truth)) / 10
+                    print(
+                        f"{dtype:>7} dim {dim:<4} rerank {rerank_k:<3} {reader.resident_bytes() / 1e6:6.2f} MB scanned, "
+                        f"load {load_ms:5.2f} ms, {query_ms:6.3f} ms/query, "
+                        f"recall@1 {hits[1] / len(queries):.3f}, recall@10 {hits[10] / len(queries):.3f}"
+                    )
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Awaitable, Callable
+
+
+class EmbeddingBatcher:
+    """
+    collects concurrent single-text embedding requests over a short window
+    and sends them as one batched call, fanning the vectors back out.
+
+    a batch is flushed when the window elapses or max_batch_size requests
+    are waiting, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        embed_batch: Callable[[list[str]], Awaitable[list[list[float]]]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 64,
+    ):
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[str, asyncio.Future, float]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.largest_batch = 0
+        self.total_queue_delay = 0.0
+        self.max_queue_delay = 0.0
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, loop.time()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[str, asyncio.Future, float]]):
+        now = asyncio.get_running_loop().time()
+        for _, _, queued_at in batch:
+            delay = now - queued_at
+            self.total_queue_delay += delay
+            self.max_queue_delay = max(self.max_queue_delay, delay)
+        self.batches += 1
+        self.requests += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        # identical texts in one window are embedded once
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = await self.embed_batch(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "avg_queue_delay_ms": 1000 * self.total_queue_delay / self.requests if self.requests else 0.0,
+            "max_queue_delay_ms": 1000 * self.max_queue_delay,
+            "pending": len(self._pending),
+        }
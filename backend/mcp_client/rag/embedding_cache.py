@@ -0,0 +1,97 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    two-tier embedding cache: a bounded in-memory LRU in front of a
+    sqlite file that survives restarts.
+
+    entries are keyed by model, task type and a hash of the text.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> str:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{model}:{task_type}:{text_hash}"
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _remember(self, key: str, embedding: list[float]):
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, task_type: str, text: str) -> list[float] | None:
+        key = self.make_key(model, task_type, text)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return embedding
+
+            try:
+                row = self._db().execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"embedding cache read failed: {e}")
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+            self._remember(key, embedding)
+            self.disk_hits += 1
+            return embedding
+
+    def put(self, model: str, task_type: str, text: str, embedding: list[float]):
+        key = self.make_key(model, task_type, text)
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            self._remember(key, list(embedding))
+            try:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", (key, blob)
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"embedding cache write failed: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
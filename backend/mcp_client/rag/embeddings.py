@@ -0,0 +1,178 @@
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..config.settings import settings
+
+load_dotenv()
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+class EmbeddingBackend:
+    """
+    turns tool documents and queries into vectors.
+
+    `name` identifies the vector space. vectors from backends with different
+    names are never compared, catalog embeddings are stored and looked up
+    under it. `local` backends run in process and are cheap enough to call
+    directly instead of going through the query cache and batcher.
+    """
+
+    name = "base"
+    local = False
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        raise NotImplementedError
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self.embed_queries(texts)
+
+
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    """
+    googles embedding API. the client is created on first use so importing
+    the rag modules does not need GOOGLE_API_KEY.
+    """
+
+    def __init__(self, model: str = "gemini-embedding-001"):
+        self.model = model
+        self.name = f"gemini:{model}"
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from google import genai
+
+                gemini_api_key = os.getenv("GEMINI_API_KEY")
+                if gemini_api_key:
+                    del os.environ["GEMINI_API_KEY"]
+
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
+                self._client = genai.Client(api_key=api_key)
+            return self._client
+
+    def _config(self, task_type: str):
+        from google.genai import types
+
+        return types.EmbedContentConfig(task_type=task_type)
+
+    def _embed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        result = self._get_client().models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=self._config(task_type),
+        )
+        return [embedding.values for embedding in result.embeddings]
+
+    async def _aembed(self, texts: list[str], task_type: str) -> list[list[float]]:
+        result = await self._get_client().aio.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=self._config(task_type),
+        )
+        return [embedding.values for embedding in result.embeddings]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "SEMANTIC_SIMILARITY")
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed(texts, "RETRIEVAL_QUERY")
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts, "SEMANTIC_SIMILARITY")
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        return await self._aembed(texts, "RETRIEVAL_QUERY")
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    local, dependency free embedder. words, word bigrams and character
+    trigrams are hashed with crc32 into `dim` signed buckets and the result
+    is L2 normalized. it only captures lexical overlap, but it needs no
+    network or model files and embeds a query in well under a millisecond.
+    """
+
+    local = True
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text: str) -> list[str]:
+        words = _WORD.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed_one(self, text: str) -> list[float]:
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in self._features(text)),
+            dtype=np.uint32,
+        )
+        if not len(hashes):
+            return [0.0] * self.dim
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim)
+        # damp repeated features so long documents are not dominated by them
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in texts]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(text) for text in texts]
+
+
+_backend: EmbeddingBackend | None = None
+_backend_lock = threading.Lock()
+
+
+def create_embedding_backend(kind: str) -> EmbeddingBackend:
+    if kind == "gemini":
+        return GeminiEmbeddingBackend(settings.embedding_model)
+    if kind == "hashing":
+        return HashingEmbeddingBackend(settings.hashing_embedding_dim)
+    raise ValueError(f"unknown embedding backend '{kind}', expected 'gemini' or 'hashing'.")
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """the process-wide backend chosen by settings.embedding_backend."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_embedding_backend(settings.embedding_backend)
+        return _backend
+
+
+def cache_collection_name(backend: EmbeddingBackend) -> str:
+    """
+    chroma collection holding the cached catalog embeddings of a backend.
+    the default gemini backend keeps the original 'cached_tools' name so
+    existing caches stay valid.
+    """
+    if backend.name == "gemini:gemini-embedding-001":
+        return "cached_tools"
+    return "cached_tools_" + re.sub(r"[^a-zA-Z0-9]+", "_", backend.name).strip("_")
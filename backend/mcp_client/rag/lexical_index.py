@@ -0,0 +1,185 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_KEYWORD_SPLIT = re.compile(r"[,;\n]+")
+_WHITESPACE = re.compile(r"\s+")
+_NAME_SEPARATORS = re.compile(r"[\s\-.]+")
+# federated tools are named <server>__<tool>, the model often asks for just <tool>
+_NAMESPACE_SEPARATOR = "__"
+
+
+def tokenize(text: str) -> list[str]:
+    """lowercase alphanumeric tokens, so snake_case names split into words."""
+    return _TOKEN.findall(text.lower())
+
+
+def normalize_name(text: str) -> str:
+    return _NAME_SEPARATORS.sub("_", text.strip().strip("'\"`").lower())
+
+
+def bare_name(name: str) -> str:
+    """the tool name without its server prefix."""
+    prefix, separator, rest = name.partition(_NAMESPACE_SEPARATOR)
+    return rest if separator and prefix and rest else name
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LexicalIndex:
+    """
+    BM25 over the tool documents plus a trigram index over tool names.
+    names are also matched without their server prefix.
+
+    everything is in memory and pure python, so name lookups take
+    microseconds and a BM25 query over a few hundred tools well under a
+    millisecond.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_part_matches: int = 3):
+        self.k1 = k1
+        self.b = b
+        self.max_part_matches = max_part_matches
+        self.names: list[str] = []
+        self._by_normalized: dict[str, list[str]] = {}
+        self._by_compact: dict[str, list[str]] = {}
+        self._by_part: dict[str, list[str]] = {}
+        self._name_trigrams: list[set[str]] = []
+        self._trigram_postings: dict[str, list[int]] = {}
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._lengths: list[int] = []
+        self._avg_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def replace(self, names: list[str], documents: list[str]):
+        """rebuilds the index from tool names and their documents."""
+        postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        trigram_postings: dict[str, list[int]] = defaultdict(list)
+        lengths = []
+        name_trigrams = []
+        for i, (name, document) in enumerate(zip(names, documents)):
+            tokens = tokenize(f"{name} {document or ''}")
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                postings[term].append((i, count))
+            grams = _trigrams(normalize_name(bare_name(name)))
+            name_trigrams.append(grams)
+            for gram in grams:
+                trigram_postings[gram].append(i)
+
+        self.names, self._lengths = list(names), lengths
+        by_normalized: dict[str, list[str]] = defaultdict(list)
+        by_compact: dict[str, list[str]] = defaultdict(list)
+        by_part: dict[str, list[str]] = defaultdict(list)
+        for name in names:
+            for key in dict.fromkeys([normalize_name(name), normalize_name(bare_name(name))]):
+                by_normalized[key].append(name)
+                by_compact[key.replace("_", "")].append(name)
+            for part in dict.fromkeys(normalize_name(bare_name(name)).split("_")):
+                if part:
+                    by_part[part].append(name)
+        self._by_normalized, self._by_compact = dict(by_normalized), dict(by_compact)
+        self._by_part = dict(by_part)
+        self._name_trigrams, self._trigram_postings = name_trigrams, dict(trigram_postings)
+        self._postings = dict(postings)
+        self._avg_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    def _lookup(self, keyword: str, min_similarity: float) -> list[str]:
+        """
+        the tools named by keyword, exactly or by trigram similarity. a bare
+        name shared by several servers resolves to all of them.
+        """
+        normalized = normalize_name(keyword)
+        if not normalized:
+            return []
+        exact = self._by_normalized.get(normalized) or self._by_compact.get(normalized.replace("_", ""))
+        if exact:
+            return list(exact)
+
+        grams = _trigrams(normalize_name(bare_name(normalized)))
+        overlaps: Counter = Counter()
+        for gram in grams:
+            for i in self._trigram_postings.get(gram, ()):
+                overlaps[i] += 1
+        best, best_score = None, 0.0
+        for i, shared in overlaps.items():
+            score = shared / (len(grams) + len(self._name_trigrams[i]) - shared)
+            if score > best_score:
+                best, best_score = i, score
+        if best is not None and best_score >= min_similarity:
+            return [self.names[best]]
+        return []
+
+    def match_name(self, keyword: str, min_similarity: float = 0.75) -> str | None:
+        """the tool named by keyword, exactly or by trigram similarity."""
+        names = self._lookup(keyword, min_similarity)
+        return names[0] if names else None
+
+    def _match_piece(self, piece: str, min_similarity: float) -> tuple[list[str], bool]:
+        """
+        tools named by one keyword as (names, complete). a keyword that is not
+        a tool name is split on whitespace and every word must then name a
+        tool, either by name or as a word of few enough tool names
+        ('weather' -> get_weather).
+        """
+        names = self._lookup(piece, min_similarity)
+        if names:
+            return names, True
+        words = [word for word in _WHITESPACE.split(piece.strip()) if word]
+        if len(words) == 1:
+            by_part = self._by_part.get(normalize_name(words[0]), [])
+            if 0 < len(by_part) <= self.max_part_matches:
+                return list(by_part), True
+            return [], False
+        names, complete = [], bool(words)
+        for word in words:
+            word_names, word_complete = self._match_piece(word, min_similarity)
+            names.extend(word_names)
+            complete = complete and word_complete
+        return names, complete
+
+    def match_names(self, keywords: str, min_similarity: float = 0.75) -> tuple[list[str], bool]:
+        """
+        resolves a comma or whitespace separated keyword list to tool names.
+        returns (names, complete) where complete means every keyword matched.
+        """
+        pieces = [piece for piece in _KEYWORD_SPLIT.split(keywords or "") if piece.strip()]
+        names, complete = [], bool(pieces)
+        for piece in pieces:
+            piece_names, piece_complete = self._match_piece(piece, min_similarity)
+            names.extend(piece_names)
+            complete = complete and piece_complete
+        return list(dict.fromkeys(names)), complete
+
+    def search(self, query: str, n_results: int = 10) -> list[tuple[str, float]]:
+        """BM25 ranking of the tools for query, best first."""
+        if not self.names:
+            return []
+        scores: dict[int, float] = defaultdict(float)
+        total = len(self.names)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            # terms in most documents, like 'tool', barely score and cost the most
+            if not postings or len(postings) > total / 2:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] += idf * count * (self.k1 + 1) / (count + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        return [(self.names[i], score) for i, score in ranked]
+
+
+def reciprocal_rank_fusion(rankings: list[list[str]], k: int = 60) -> list[tuple[str, float]]:
+    """fuses several best-first name rankings, each name scores 1 / (k + rank)."""
+    scores: dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, name in enumerate(ranking):
+            scores[name] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
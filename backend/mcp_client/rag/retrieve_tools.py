@@ -1,97 +1,198 @@
-import os
-import chromadb
-from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from ..config.settings import settings
+from ..utils.executor import run_blocking
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import EmbeddingCache
+from .embeddings import get_embedding_backend
+from .tool_index import ToolScope, get_tool_index
+from .lexical_index import reciprocal_rank_fusion
+
+query_cache = EmbeddingCache(settings.embedding_cache_path, settings.embedding_cache_size)
+    
+def embed_query(query_text: str) -> list[float]:
+    """
+    generates an embedding for a single query string with the configured
+    backend. repeated queries to a remote backend are served from the
+    embedding cache.
+    """
+    backend = get_embedding_backend()
+    if backend.local:
+        return backend.embed_queries([query_text])[0]
 
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
+    task_type = "RETRIEVAL_QUERY"
+    cached = query_cache.get(backend.name, task_type, query_text)
+    if cached is not None:
+        return cached
+    
+    embedding = backend.embed_queries([query_text])[0]
+    query_cache.put(backend.name, task_type, query_text, embedding)
+    return embedding
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if gemini_api_key:
-    del os.environ["GEMINI_API_KEY"]
+async def _embed_query_batch(query_texts: list[str]) -> list[list[float]]:
+    return await get_embedding_backend().aembed_queries(query_texts)
 
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found.")
+query_batcher = EmbeddingBatcher(
+    _embed_query_batch,
+    window_ms=settings.embedding_batch_window_ms,
+    max_batch_size=settings.embedding_batch_max_size,
+)
 
-client = genai.Client(api_key=api_key)
-    
-def embed_query(query_text: str) -> list[float]:
+async def aembed_query(query_text: str) -> list[float]:
     """
-    generates an embedding for a single query string using googles API.
+    async variant of embed_query. cache misses from concurrent sessions
+    are micro-batched into a single embed_content call. local backends are
+    called directly, they are faster than a cache lookup.
     """
-    embedding_model = "gemini-embedding-001"
+    backend = get_embedding_backend()
+    if backend.local:
+        return backend.embed_queries([query_text])[0]
+
     task_type = "RETRIEVAL_QUERY"
-    
-    result = client.models.embed_content(
-        model=embedding_model,
-        contents=[query_text],
-        config=types.EmbedContentConfig(task_type=task_type)
-    )
-    return result.embeddings[0].values
+    cached = await run_blocking(query_cache.get, backend.name, task_type, query_text)
+    if cached is not None:
+        return cached
+
+    embedding = await query_batcher.embed(query_text)
+    await run_blocking(query_cache.put, backend.name, task_type, query_text, embedding)
+    return embedding
+
+def _select_tools(
+    all_pairs: list[tuple[str, float]],
+    distance_threshold: float,
+    top_k_fallback: int,
+    with_distances: bool = False,
+) -> list:
+    """
+    applies the distance threshold and top-k fallback to nearest-first pairs.
+    returns names, or (name, distance) pairs when with_distances is set.
+    """
+    relevant_pairs: list[tuple[str, float]] = []
+    for tool_name, distance in all_pairs:
+        if distance < distance_threshold:
+            print(f"  -> Found relevant tool: '{tool_name}' (Distance: {distance:.4f}) - ACCEPTED")
+            relevant_pairs.append((tool_name, distance))
+        else:
+            print(f"  -> Found tool: '{tool_name}' (Distance: {distance:.4f}) - REJECTED (Threshold: {distance_threshold})")
+            pass
+
+    # Fallback: if none under threshold, return top-k most similar tools by distance
+    if not relevant_pairs and top_k_fallback > 0 and all_pairs:
+        # all_pairs is already sorted nearest first
+        relevant_pairs = list(all_pairs[:top_k_fallback])
+        print(f"No tools under threshold. Using top-{top_k_fallback} fallback: {[name for name, _ in relevant_pairs]}")
+
+    if with_distances:
+        return relevant_pairs
+    return [name for name, _ in relevant_pairs]
 
 def retrieve_semantic_tools(
     query: str,
-    collection_name: str,
+    scope: ToolScope | None,
     distance_threshold: float = 0.6,
     top_k_fallback: int = 0,
-) -> list[str]:
+    with_distances: bool = False,
+) -> list:
     """
     takes a query and retrieves the most semantically similar
-    tools from the specified chromaDB collection.
+    tools within the given scope of the tool cache.
     """
+    if not scope:
+        print("No tool catalog in scope, skipping tool retrieval.")
+        return []
     query_embedding = embed_query(query)
-    
-    db_path = "./chroma_db"
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(f"chromaDB path not found at '{db_path}'.")
-        
-    client = chromadb.PersistentClient(path=db_path)
-    
-    try:
-        collection = client.get_collection(name=collection_name)
-    except ValueError:
-        raise ValueError(f"collection '{collection_name}' not found.")
-
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=100,
-        include=["metadatas", "distances"]
+
+    index = get_tool_index(scope.collection_name, scope.db_path)
+    all_pairs = index.query(query_embedding, n_results=100, backend=get_embedding_backend().name, scope=scope)
+
+    return _select_tools(all_pairs, distance_threshold, top_k_fallback, with_distances)
+
+async def aretrieve_semantic_tools(
+    query: str,
+    scope: ToolScope | None,
+    distance_threshold: float = 0.6,
+    top_k_fallback: int = 0,
+    with_distances: bool = False,
+) -> list:
+    """
+    async variant of retrieve_semantic_tools. the index lookup runs on
+    the blocking thread pool since a first query may load it from disk.
+    """
+    if not scope:
+        print("No tool catalog in scope, skipping tool retrieval.")
+        return []
+    query_embedding = await aembed_query(query)
+
+    index = get_tool_index(scope.collection_name, scope.db_path)
+    all_pairs = await run_blocking(
+        index.query, query_embedding, n_results=100, backend=get_embedding_backend().name, scope=scope
     )
-    retrieved_metadatas = results['metadatas'][0]
-    distances = results['distances'][0]
-    
-    relevant_tool_names: list[str] = []
-    all_pairs: list[tuple[str, float]] = []
-    for i, metadata in enumerate(retrieved_metadatas):
-        distance = distances[i]
-        tool_name = metadata.get('tool_name', 'Unknown Tool')
-        all_pairs.append((tool_name, distance))
 
-        if distance < distance_threshold:
-            print(f"  -> Found relevant tool: '{tool_name}' (Distance: {distance:.4f}) - ACCEPTED")
-            relevant_tool_names.append(tool_name)
-        else:
-            print(f"  -> Found tool: '{tool_name}' (Distance: {distance:.4f}) - REJECTED (Threshold: {distance_threshold})")
-            pass
+    return _select_tools(all_pairs, distance_threshold, top_k_fallback, with_distances)
 
-    # Fallback: if none under threshold, return top-k most similar tools by distance
-    if not relevant_tool_names and top_k_fallback > 0 and all_pairs:
-        all_pairs.sort(key=lambda x: x[1])  # lower distance = more similar
-        fallback = [name for name, _ in all_pairs[:top_k_fallback]]
-        print(f"No tools under threshold. Using top-{top_k_fallback} fallback: {fallback}")
-        return fallback
 
-    return relevant_tool_names
+def _fuse(exact: list[str], semantic: list[str], lexical: list[tuple[str, float]]) -> list[str]:
+    """exact name matches first, then the semantic and BM25 candidates by rank fusion."""
+    lexical_names = [name for name, _ in lexical[:settings.lexical_top_k]]
+    fused = reciprocal_rank_fusion([semantic, lexical_names], k=settings.rrf_k)
+    return list(dict.fromkeys(exact + [name for name, _ in fused]))
 
+def hybrid_retrieve_tools(
+    keywords: str,
+    query: str,
+    scope: ToolScope | None,
+    distance_threshold: float = 0.6,
+    top_k_fallback: int = 0,
+) -> list[str]:
+    """
+    resolves keywords that name tools directly without embedding anything.
+    otherwise the semantic candidates for query are fused with a BM25
+    search over the tool documents.
+    """
+    if not scope:
+        print("No tool catalog in scope, skipping tool retrieval.")
+        return []
+    lexical = get_tool_index(scope.collection_name, scope.db_path).lexical_for(scope)
+    exact, complete = lexical.match_names(keywords, settings.lexical_name_similarity)
+    if complete:
+        print(f"Exact tool name matches, skipping embedding: {exact}")
+        return exact
+
+    semantic = retrieve_semantic_tools(query, scope, distance_threshold, top_k_fallback)
+    return _fuse(exact, semantic, lexical.search(keywords))
+
+async def ahybrid_retrieve_tools(
+    keywords: str,
+    query: str,
+    scope: ToolScope | None,
+    distance_threshold: float = 0.6,
+    top_k_fallback: int = 0,
+) -> list[str]:
+    """
+    async variant of hybrid_retrieve_tools. name matches never leave the
+    event loop once the index is loaded.
+    """
+    if not scope:
+        print("No tool catalog in scope, skipping tool retrieval.")
+        return []
+    index = get_tool_index(scope.collection_name, scope.db_path)
+    if not index.loaded:
+        await run_blocking(index.ensure_loaded)
+    lexical = index.lexical_for(scope)
+    exact, complete = lexical.match_names(keywords, settings.lexical_name_similarity)
+    if complete:
+        print(f"Exact tool name matches, skipping embedding: {exact}")
+        return exact
+
+    semantic = await aretrieve_semantic_tools(query, scope, distance_threshold, top_k_fallback)
+    return _fuse(exact, semantic, lexical.search(keywords))
 
 
 def get_relevant_tools_for_chat(
     chat_history: list[dict],
-    collection_name: str,
+    scope: ToolScope | None,
     distance_threshold: float = 0.784,
     top_k_fallback: int = 3,
-) -> list[str]:
+    with_distances: bool = False,
+) -> list:
     """
     finds relevant tools by embedding the context of the entire chat history.
     """
@@ -99,14 +200,40 @@ def get_relevant_tools_for_chat(
     contextual_query = str(recent_history)
     return retrieve_semantic_tools(
         contextual_query,
-        collection_name,
+        scope,
+        distance_threshold=distance_threshold,
+        top_k_fallback=top_k_fallback,
+        with_distances=with_distances,
+    )
+
+async def aget_relevant_tools_for_chat(
+    chat_history: list[dict],
+    scope: ToolScope | None,
+    distance_threshold: float = 0.784,
+    top_k_fallback: int = 3,
+    with_distances: bool = False,
+) -> list:
+    """
+    async variant of get_relevant_tools_for_chat.
+    """
+    recent_history = chat_history[-5:]
+    contextual_query = str(recent_history)
+    return await aretrieve_semantic_tools(
+        contextual_query,
+        scope,
         distance_threshold=distance_threshold,
         top_k_fallback=top_k_fallback,
+        with_distances=with_distances,
     )
 
 if __name__ == "__main__":
     try:
-        tool_collection = "tools"
+        from .embeddings import cache_collection_name
+
+        # every cached tool is in scope
+        index = get_tool_index(cache_collection_name(get_embedding_backend()), "./chroma_db")
+        index.ensure_loaded()
+        tool_scope = ToolScope(index.collection_name, index.db_path, index.ids)
         chat_history = [
     {'role': 'user', 'content': 'That last task was tough.'},
     {'role': 'assistant', 'content': 'I can imagine! Glad we got through it.'},
@@ -114,8 +241,8 @@ if __name__ == "__main__":
         ]
 
         
-        contextual_tools = get_relevant_tools_for_chat(chat_history, tool_collection, distance_threshold=0.784)
-        # contextual_tools = retrieve_semantic_tools(str(chat_history), tool_collection, distance_threshold=0.76)
+        contextual_tools = get_relevant_tools_for_chat(chat_history, tool_scope, distance_threshold=0.784)
+        # contextual_tools = retrieve_semantic_tools(str(chat_history), tool_scope, distance_threshold=0.76)
 
         
         for i, tool in enumerate(contextual_tools, 1):
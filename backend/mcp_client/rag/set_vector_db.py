@@ -1,43 +1,60 @@
-import os
-import uuid
-import numpy as np
-import chromadb
+import asyncio
 import hashlib
-from google import genai 
-from google.genai import types
-from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict
 
-load_dotenv()
+from ..config.settings import settings
+from ..utils.executor import run_blocking
+from .embeddings import cache_collection_name, get_embedding_backend
+from .tool_index import ToolScope, get_chroma_client, get_tool_index
 
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if gemini_api_key:
-    del os.environ["GEMINI_API_KEY"]
-
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
-
-client = genai.Client(api_key=api_key)
+# (db_path, catalog fingerprint) -> scope, so an unchanged catalog costs no chroma calls
+_scopes: "OrderedDict[tuple[str, str], ToolScope]" = OrderedDict()
+_MAX_SCOPES = 64
+# ingests run on the blocking thread pool, _scopes is shared between them
+_scopes_lock = threading.Lock()
 
 def generate_stable_id(content: str) -> str:
     """generates a stable unique ID based on the content of the string."""
     return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
+def catalog_fingerprint(tools_data: list[dict], backend_name: str = "") -> str:
+    """
+    hash over the sorted tool documents, independent of list_tools order.
+    the embedding backend is part of it, switching backends re-ingests.
+    """
+    documents = sorted(tool['document'] for tool in tools_data)
+    return generate_stable_id("\0".join([backend_name] + documents))
+
+def _remember_scope(db_path: str, scope: ToolScope):
+    key = (db_path, scope.fingerprint)
+    with _scopes_lock:
+        _scopes[key] = scope
+        _scopes.move_to_end(key)
+        while len(_scopes) > _MAX_SCOPES:
+            _scopes.popitem(last=False)
+
 def embed_content(contents: list[str]) -> dict:
     if not contents or not isinstance(contents, list):
         raise ValueError("input must be a non-empty list of strings.")
 
     ids = [generate_stable_id(doc) for doc in contents]
+    embeddings = get_embedding_backend().embed_documents(contents)
 
-    embedding_model = "gemini-embedding-001"
+    return {
+        "ids": ids,
+        "embeddings": embeddings,
+        "documents": contents
+    }
 
-    result = client.models.embed_content(
-        model=embedding_model,
-        contents=contents,
-        config=types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")
-    ).embeddings
+async def aembed_content(contents: list[str]) -> dict:
+    """async variant of embed_content using the backends async client."""
+    if not contents or not isinstance(contents, list):
+        raise ValueError("input must be a non-empty list of strings.")
 
-    embeddings = [embedding.values for embedding in result]
+    ids = [generate_stable_id(doc) for doc in contents]
+    embeddings = await get_embedding_backend().aembed_documents(contents)
 
     return {
         "ids": ids,
@@ -49,7 +66,7 @@ def upsert_to_chroma(db_data: dict, collection_name: str, db_path: str = "./chro
     """
     upserts data into a chromadb collection.
     """
-    client = chromadb.PersistentClient(path=db_path)
+    client = get_chroma_client(db_path)
     collection = client.get_or_create_collection(name=collection_name)
 
     collection.upsert(**db_data)
@@ -57,79 +74,243 @@ def upsert_to_chroma(db_data: dict, collection_name: str, db_path: str = "./chro
     print(f"successfully upserted {len(db_data['ids'])} documents into ChromaDB.")
     return collection
 
-def save_tools_to_vector_db(tools_data: list[str], db_path: str = "./chroma_db"):
+def _plan_ingest(tools_data: list[dict], db_path: str, server_id: str) -> dict:
     """
-    saves tools to two vector database collections:
-    'cached_tools': persistent collection of all unique tools ever processed.
-    'tools': temporary collection holding only the new tools from the current run.
+    works out which tools still need embedding and makes sure the cache
+    index holds every tool of the catalog that is already cached.
+    when the catalog was seen before, the plan only carries its scope.
+    """
+    backend = get_embedding_backend()
+    fingerprint = catalog_fingerprint(tools_data, backend.name)
+    with _scopes_lock:
+        scope = _scopes.get((db_path, fingerprint))
+    if scope is not None:
+        index = get_tool_index(scope.collection_name, db_path)
+        index.ensure_loaded()
+        if scope.epoch == index.epoch:
+            print(f"Tool catalog of '{server_id}' unchanged, skipping ingestion.")
+            return {"scope": scope}
+        # the index lost rows since the scope was built, ingest the catalog again
+        with _scopes_lock:
+            if _scopes.get((db_path, fingerprint)) is scope:
+                del _scopes[(db_path, fingerprint)]
+
+    chroma_client = get_chroma_client(db_path)
+    # every backend has its own cache collection, vectors of different backends never mix
+    cached_collection = chroma_client.get_or_create_collection(
+        name=cache_collection_name(backend),
+        metadata={"embedding_backend": backend.name},
+    )
+    if (cached_collection.metadata or {}).get("embedding_backend") != backend.name:
+        # caches created before embeddings were tagged with their backend
+        cached_collection.modify(metadata={"embedding_backend": backend.name})
+
+    index = get_tool_index(cached_collection.name, db_path)
+    index.ensure_loaded()
+    
+    all_documents = [tool['document'] for tool in tools_data]
+    all_tool_ids = [generate_stable_id(doc) for doc in all_documents]
+    
+    existing_in_cache_ids = set(cached_collection.get(ids=all_tool_ids)['ids'])
+
+    # another worker may have cached tools since this index was loaded
+    missing_from_index = [tool_id for tool_id in existing_in_cache_ids if tool_id not in index]
+    if missing_from_index:
+        cached = cached_collection.get(ids=missing_from_index, include=["embeddings", "documents", "metadatas"])
+        index.add(cached["ids"], cached["embeddings"], cached["metadatas"], cached["documents"], backend.name)
+    
+    # identify new tools that need to be embedded, keeping their dict structure
+    new_tools_to_embed_data = list({
+        all_tool_ids[i]: tool for i, tool in enumerate(tools_data)
+        if all_tool_ids[i] not in existing_in_cache_ids
+    }.values())
+    
+    print(f"Input contains {len(tools_data)} tools: {len(new_tools_to_embed_data)} new, {len(existing_in_cache_ids)} existing in cache.")
+    return {
+        "scope": None,
+        "db_path": db_path,
+        "server_id": server_id,
+        "backend": backend.name,
+        "cached_collection": cached_collection.name,
+        "fingerprint": fingerprint,
+        "all_ids": list(dict.fromkeys(all_tool_ids)),
+        "new_tools": new_tools_to_embed_data,
+        "embedded": [],
+    }
+
+class IngestProgress:
+    """counts embedded documents and reports progress and throughput."""
+
+    def __init__(self, server_id: str, total: int):
+        self.server_id = server_id
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.perf_counter()
+
+    def docs_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def advance(self, count: int):
+        self.done += count
+        print(
+            f"Embedded {self.done}/{self.total} tools of '{self.server_id}' "
+            f"({self.docs_per_second():.1f} docs/s)"
+        )
+
+    def fail(self, count: int, error: Exception):
+        self.failed += count
+        print(f"Embedding a batch of {count} tools of '{self.server_id}' failed: {error}")
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (
+            f"embedded {self.done} tools in {elapsed:.1f}s ({self.docs_per_second():.1f} docs/s), "
+            f"{self.failed} failed"
+        )
+
+def _batches(tools: list[dict], size: int) -> list[list[dict]]:
+    return [tools[i:i + size] for i in range(0, len(tools), size)]
+
+def _cache_batch(plan: dict, batch: list[dict], embedded_data: dict):
+    """upserts one embedded batch into the cache collection right away."""
+    embedded_data['metadatas'] = [
+        {'tool_name': tool['name'], 'embedding_backend': plan["backend"]} for tool in batch
+    ]
+    upsert_to_chroma(embedded_data, plan["cached_collection"], plan["db_path"])
+    plan["embedded"].append(embedded_data)
+
+def _index_embedded(plan: dict):
+    """adds every batch embedded by this ingest to the index in one write."""
+    if not plan["embedded"]:
+        return
+    get_tool_index(plan["cached_collection"], plan["db_path"]).add(
+        [tool_id for data in plan["embedded"] for tool_id in data["ids"]],
+        [embedding for data in plan["embedded"] for embedding in data["embeddings"]],
+        [metadata for data in plan["embedded"] for metadata in data["metadatas"]],
+        [document for data in plan["embedded"] for document in data["documents"]],
+        plan["backend"],
+    )
+
+def _embed_batches(plan: dict) -> IngestProgress:
+    """
+    embeds the new tools batch by batch, caching each batch as it completes.
+    a failed batch is retried, then left for the next ingest to pick up.
+    """
+    progress = IngestProgress(plan["server_id"], len(plan["new_tools"]))
+    for batch in _batches(plan["new_tools"], settings.embedding_ingest_batch_size):
+        for attempt in range(settings.embedding_ingest_retries + 1):
+            try:
+                embedded_data = embed_content([tool['document'] for tool in batch])
+                _cache_batch(plan, batch, embedded_data)
+                progress.advance(len(batch))
+                break
+            except Exception as e:
+                if attempt == settings.embedding_ingest_retries:
+                    progress.fail(len(batch), e)
+                else:
+                    time.sleep(2 ** attempt)
+    return progress
+
+async def _aembed_batches(plan: dict) -> IngestProgress:
+    """
+    async variant of _embed_batches, up to settings.embedding_ingest_concurrency
+    batches are embedded at once.
+    """
+    progress = IngestProgress(plan["server_id"], len(plan["new_tools"]))
+    semaphore = asyncio.Semaphore(settings.embedding_ingest_concurrency)
+
+    async def run_batch(batch: list[dict]):
+        async with semaphore:
+            for attempt in range(settings.embedding_ingest_retries + 1):
+                try:
+                    embedded_data = await aembed_content([tool['document'] for tool in batch])
+                    await run_blocking(_cache_batch, plan, batch, embedded_data)
+                    progress.advance(len(batch))
+                    return
+                except Exception as e:
+                    if attempt == settings.embedding_ingest_retries:
+                        progress.fail(len(batch), e)
+                    else:
+                        await asyncio.sleep(2 ** attempt)
+
+    await asyncio.gather(*(
+        run_batch(batch) for batch in _batches(plan["new_tools"], settings.embedding_ingest_batch_size)
+    ))
+    return progress
+
+def _build_scope(plan: dict, complete: bool) -> ToolScope:
+    """
+    the scope over every tool of the catalog that is cached. only a complete
+    ingest is remembered, so the next one retries the missing tools.
+    """
+    _index_embedded(plan)
+    index = get_tool_index(plan["cached_collection"], plan["db_path"])
+    cached_ids = [tool_id for tool_id in plan["all_ids"] if tool_id in index]
+    scope = ToolScope(plan["cached_collection"], plan["db_path"], cached_ids, plan["fingerprint"])
+    scope.epoch = index.epoch
+    if complete:
+        _remember_scope(plan["db_path"], scope)
+    else:
+        print(f"{len(plan['all_ids']) - len(cached_ids)} tools of '{plan['server_id']}' are missing, retried on the next ingest.")
+    print(f"Scoped '{plan['server_id']}' to {len(scope)} of the {len(index)} tools in '{plan['cached_collection']}'.")
+    return scope
+
+def save_tools_to_vector_db(tools_data: list[str], db_path: str = "./chroma_db", server_id: str = "default") -> ToolScope | None:
+    """
+    caches the embeddings of tools in 'cached_tools', the persistent
+    collection of all unique tools ever processed, one per embedding backend,
+    and returns the ToolScope retrieval should use for this catalog.
+
+    new tools are embedded in batches of settings.embedding_ingest_batch_size
+    and each batch is cached in chroma as soon as it is embedded, so an
+    interrupted ingest resumes with the tools that are still missing. the
+    index takes all of them in one write at the end. scoping itself
+    writes nothing, sessions with different catalogs share the cache safely.
+    returns None when ingestion failed.
+    """
+    try:
+        plan = _plan_ingest(tools_data, db_path, server_id)
+        if plan["scope"] is not None:
+            return plan["scope"]
+
+        complete = True
+        if plan["new_tools"]:
+            print(f"Embedding {len(plan['new_tools'])} new tools...")
+            progress = _embed_batches(plan)
+            print(f"Ingest of '{server_id}': {progress.summary()}")
+            complete = progress.failed == 0
+
+        return _build_scope(plan, complete)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return None
+
+async def asave_tools_to_vector_db(tools_data: list[str], db_path: str = "./chroma_db", server_id: str = "default") -> ToolScope | None:
+    """
+    async variant of save_tools_to_vector_db. chroma work runs on the
+    blocking thread pool and batches are embedded concurrently with the
+    backends async client.
     """
     try:
-        cached_collection_name = "cached_tools"
-        session_collection_name = "tools"
-        
-        chroma_client = chromadb.PersistentClient(path=db_path)
-        cached_collection = chroma_client.get_or_create_collection(name=cached_collection_name)
-        
-        all_documents = [tool['document'] for tool in tools_data]
-        all_metadatas = [{'tool_name': tool['name']} for tool in tools_data]
-        all_tool_ids = [generate_stable_id(doc) for doc in all_documents]
-        
-        existing_in_cache_ids = set(cached_collection.get(ids=all_tool_ids)['ids'])
-        
-        # identify new tools that need to be embedded, keeping their dict structure
-        new_tools_to_embed_data = [
-            tool for i, tool in enumerate(tools_data) 
-            if all_tool_ids[i] not in existing_in_cache_ids
-        ]
-        
-        print(f"Input contains {len(tools_data)} tools: {len(new_tools_to_embed_data)} new, {len(existing_in_cache_ids)} existing in cache.")
-
-        session_tools_data = {"ids": [], "embeddings": [], "documents": [], "metadatas": []}
-        
-        if new_tools_to_embed_data:
-            print(f"Embedding {len(new_tools_to_embed_data)} new tools...")
-            new_documents = [tool['document'] for tool in new_tools_to_embed_data]
-            newly_embedded_data = embed_content(new_documents)
-            
-            newly_embedded_data['metadatas'] = [{'tool_name': tool['name']} for tool in new_tools_to_embed_data]
-            
-            upsert_to_chroma(newly_embedded_data, cached_collection_name, db_path)
-            
-            for key in session_tools_data.keys():
-                session_tools_data[key].extend(newly_embedded_data[key])
-
-        if existing_in_cache_ids:
-            print(f"Fetching {len(existing_in_cache_ids)} existing tools from the cache...")
-            # fetch the full data including embeddings from the cache
-            existing_tools_from_db = cached_collection.get(
-                ids=list(existing_in_cache_ids),
-                include=["embeddings", "documents","metadatas"]
-            )
-            
-            # add the existing tool data to our session data
-            for key in session_tools_data.keys():
-                session_tools_data[key].extend(existing_tools_from_db[key])
-
-        print(f"Resetting the '{session_collection_name}' collection...")
-        try:
-            chroma_client.delete_collection(name=session_collection_name)
-        except:
-            pass
-        session_collection = chroma_client.get_or_create_collection(name=session_collection_name)
-        
-        if session_tools_data["ids"]:
-            upsert_to_chroma(session_tools_data, session_collection_name, db_path)
-
-        final_cache_count = cached_collection.count()
-        final_session_count = session_collection.count()
-        
-        print("-" * 50)
-        print("Operation Complete.")
-        print(f"The '{cached_collection.name}' collection now has {final_cache_count} total unique tools.")
-        print(f"The '{session_collection.name}' collection now has {final_session_count} tools for this session.")
-        print("-" * 50)
+        plan = await run_blocking(_plan_ingest, tools_data, db_path, server_id)
+        if plan["scope"] is not None:
+            return plan["scope"]
+
+        complete = True
+        if plan["new_tools"]:
+            print(f"Embedding {len(plan['new_tools'])} new tools...")
+            progress = await _aembed_batches(plan)
+            print(f"Ingest of '{server_id}': {progress.summary()}")
+            complete = progress.failed == 0
+
+        return await run_blocking(_build_scope, plan, complete)
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        return None
+
 if __name__ == "__main__":
     pass
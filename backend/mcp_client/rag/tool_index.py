@@ -0,0 +1,289 @@
+import os
+import threading
+
+import chromadb
+import numpy as np
+
+from ..config.settings import settings
+from .compact_store import CompactVectorStore
+from .lexical_index import LexicalIndex
+
+
+_chroma_clients: dict[str, "chromadb.ClientAPI"] = {}
+_tool_indexes: dict[tuple[str, str], "ToolIndex"] = {}
+_registry_lock = threading.Lock()
+
+
+def get_chroma_client(db_path: str = "./chroma_db"):
+    """
+    returns a process-wide chromadb client for the given path,
+    creating it on first use.
+    """
+    with _registry_lock:
+        client = _chroma_clients.get(db_path)
+        if client is None:
+            client = chromadb.PersistentClient(path=db_path)
+            _chroma_clients[db_path] = client
+        return client
+
+
+class ToolScope:
+    """
+    the tools one catalog is allowed to see inside a shared ToolIndex.
+
+    a scope is only a set of tool ids, building one writes nothing and it
+    never changes afterwards, so any number of sessions can query the same
+    index through their own scopes at once. the row mask and the lexical
+    index over the allowed tools are derived lazily per index version.
+    """
+
+    def __init__(self, collection_name: str, db_path: str, ids: list[str], fingerprint: str = ""):
+        self.collection_name = collection_name
+        self.db_path = db_path
+        self.ids = tuple(dict.fromkeys(ids))
+        self.fingerprint = fingerprint
+        # ToolIndex.epoch when the scope was built
+        self.epoch = 0
+        self._mask: tuple[int, np.ndarray] | None = None
+        self._lexical: tuple[int, LexicalIndex] | None = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _rows(self, rows: dict[str, int]) -> list[int]:
+        return [rows[tool_id] for tool_id in self.ids if tool_id in rows]
+
+    def mask(self, version: int, rows: dict[str, int], size: int) -> np.ndarray:
+        cached = self._mask
+        if cached is None or cached[0] != version:
+            mask = np.zeros(size, dtype=bool)
+            mask[self._rows(rows)] = True
+            cached = (version, mask)
+            self._mask = cached
+        return cached[1]
+
+    def lexical(self, version: int, rows: dict[str, int], names: list[str], documents: list[str]) -> LexicalIndex:
+        cached = self._lexical
+        if cached is None or cached[0] != version:
+            allowed = self._rows(rows)
+            lexical = LexicalIndex()
+            lexical.replace([names[i] for i in allowed], [documents[i] for i in allowed])
+            cached = (version, lexical)
+            self._lexical = cached
+        return cached[1]
+
+
+class ToolIndex:
+    """
+    in-memory copy of a chroma tool collection.
+
+    embeddings are kept as one contiguous float32 matrix so a query is a
+    single matrix-vector product. distances are squared L2, the same metric
+    chroma uses for collections created with the default settings.
+    queries can be limited to a ToolScope.
+
+    `backend` names the embedding backend the vectors came from, queries
+    embedded by another backend are refused instead of compared.
+
+    with settings.compact_vectors the vectors live in a CompactVectorStore
+    instead of the in-memory matrix. loading then maps the store without
+    touching chroma, and other workers pick up a rewrite on their next query.
+    """
+
+    def __init__(self, collection_name: str, db_path: str = "./chroma_db"):
+        self.collection_name = collection_name
+        self.db_path = db_path
+        self.ids: list[str] = []
+        self.names: list[str] = []
+        self.documents: list[str] = []
+        self.matrix = np.empty((0, 0), dtype=np.float32)
+        self.sq_norms = np.empty((0,), dtype=np.float32)
+        self.backend: str | None = None
+        self.version = 0
+        # bumped when a reload loses rows, scopes built before it may miss tools
+        self.epoch = 0
+        self._rows: dict[str, int] = {}
+        self.store: CompactVectorStore | None = None
+        # the store generation the rows above were taken from
+        self._view: dict | None = None
+        if settings.compact_vectors:
+            self.store = CompactVectorStore(
+                os.path.join(settings.compact_vector_path, collection_name),
+                dim=settings.compact_vector_dim,
+                dtype=settings.compact_vector_dtype,
+                rerank_k=settings.compact_rerank_k,
+            )
+        self.loaded = False
+        self._lock = threading.Lock()
+        # serializes replace and add, readers only take _lock
+        self._write_lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, tool_id: str) -> bool:
+        return tool_id in self._rows
+
+    def load(self):
+        """loads the collection from chroma into memory."""
+        if self.store is not None and self.store.open():
+            self._use_store()
+            return
+
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"chromaDB path not found at '{self.db_path}'.")
+
+        client = get_chroma_client(self.db_path)
+        try:
+            collection = client.get_collection(name=self.collection_name)
+        except ValueError:
+            raise ValueError(f"collection '{self.collection_name}' not found.")
+
+        data = collection.get(include=["embeddings", "metadatas", "documents"])
+        backend = (collection.metadata or {}).get("embedding_backend")
+        self.replace(data["ids"], data["embeddings"], data["metadatas"], data["documents"], backend)
+
+    def ensure_loaded(self):
+        if not self.loaded or (self.store is not None and self.store.changed()):
+            self.load()
+
+    def _swap(self, ids, names, documents, matrix, sq_norms, backend, view=None):
+        rows = {tool_id: i for i, tool_id in enumerate(ids)}
+        with self._lock:
+            if any(tool_id not in rows for tool_id in self.ids):
+                self.epoch += 1
+            self.ids = list(ids)
+            self.names = list(names)
+            self.documents = list(documents)
+            self.matrix = matrix
+            self.sq_norms = sq_norms
+            self.backend = backend
+            self._rows = rows
+            self._view = view
+            self.version += 1
+            self.loaded = True
+
+    def _use_store(self):
+        view = self.store.snapshot()
+        empty = np.empty((0, 0), dtype=np.float32)
+        self._swap(
+            view["ids"], view["names"], view["documents"], empty, np.empty((0,), dtype=np.float32), view["backend"], view
+        )
+
+    def replace(
+        self,
+        ids: list[str],
+        embeddings,
+        metadatas: list[dict],
+        documents: list[str] | None = None,
+        backend: str | None = None,
+    ):
+        """swaps the index contents for the given ids, embeddings, metadatas and documents."""
+        names = [(metadata or {}).get("tool_name", "Unknown Tool") for metadata in metadatas]
+        documents = list(documents) if documents is not None else [""] * len(names)
+        with self._write_lock:
+            if self.store is not None and len(ids):
+                self.store.write(ids, names, embeddings, documents, backend)
+                self._use_store()
+                return
+
+            if len(ids):
+                matrix = np.ascontiguousarray(np.asarray(embeddings, dtype=np.float32))
+                sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+                sq_norms = np.empty((0,), dtype=np.float32)
+            self._swap(ids, names, documents, matrix, sq_norms, backend)
+
+    def add(self, ids: list[str], embeddings, metadatas: list[dict], documents: list[str], backend: str | None = None):
+        """
+        appends the tools whose ids are not in the index yet. with a compact
+        store they are merged into its latest generation, which may hold
+        tools other workers added meanwhile.
+        """
+        with self._write_lock:
+            if self.store is not None:
+                names = [(metadata or {}).get("tool_name", "Unknown Tool") for metadata in metadatas]
+                self.store.append(ids, names, embeddings, list(documents), backend)
+                self._use_store()
+                return
+            fresh = list({tool_id: i for i, tool_id in enumerate(ids) if tool_id not in self._rows}.values())
+            if not fresh:
+                return
+            if self.backend and backend and self.backend != backend:
+                raise ValueError(f"cannot add '{backend}' embeddings to an index of '{self.backend}' embeddings.")
+
+            new_matrix = np.asarray([embeddings[i] for i in fresh], dtype=np.float32)
+            if len(self.ids):
+                new_matrix = np.concatenate([self.matrix, new_matrix])
+            self.replace(
+                self.ids + [ids[i] for i in fresh],
+                new_matrix,
+                [{"tool_name": name} for name in self.names] + [metadatas[i] for i in fresh],
+                self.documents + [documents[i] for i in fresh],
+                self.backend or backend,
+            )
+
+    def lexical_for(self, scope: ToolScope) -> LexicalIndex:
+        """lexical index over the tools in scope."""
+        self.ensure_loaded()
+        with self._lock:
+            version, rows, names, documents = self.version, self._rows, self.names, self.documents
+        return scope.lexical(version, rows, names, documents)
+
+    def query(
+        self,
+        query_embedding,
+        n_results: int = 100,
+        backend: str | None = None,
+        scope: ToolScope | None = None,
+    ) -> list[tuple[str, float]]:
+        """
+        returns up to n_results (tool_name, distance) pairs,
+        nearest first. with a scope only its tools are considered.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            matrix, sq_norms, names, index_backend = self.matrix, self.sq_norms, self.names, self.backend
+            version, rows, view = self.version, self._rows, self._view
+
+        if not len(names):
+            return []
+        if backend and index_backend != backend:
+            print(
+                f"'{self.collection_name}' holds '{index_backend}' embeddings, "
+                f"not comparing a '{backend}' query until the catalog is re-ingested."
+            )
+            return []
+        mask = scope.mask(version, rows, len(names)) if scope is not None else None
+        if view is not None:
+            # the mask matches this snapshot, not whatever the store mapped since
+            return self.store.query(query_embedding, n_results, mask, view)
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        distances = sq_norms - 2.0 * (matrix @ query) + float(query @ query)
+        candidates = len(names)
+        if mask is not None:
+            distances = np.where(mask, distances, np.inf)
+            candidates = int(mask.sum())
+
+        k = min(n_results, candidates)
+        if not k:
+            return []
+        if k < len(names):
+            top = np.argpartition(distances, k - 1)[:k]
+        else:
+            top = np.arange(len(names))
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [(names[i], float(distances[i])) for i in top]
+
+
+def get_tool_index(collection_name: str, db_path: str = "./chroma_db") -> ToolIndex:
+    """returns the process-wide index for a collection."""
+    key = (db_path, collection_name)
+    with _registry_lock:
+        index = _tool_indexes.get(key)
+        if index is None:
+            index = ToolIndex(collection_name, db_path)
+            _tool_indexes[key] = index
+        return index
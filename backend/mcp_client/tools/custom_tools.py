@@ -1,7 +1,9 @@
-from ..rag.retrieve_tools import retrieve_semantic_tools
+from ..rag.retrieve_tools import hybrid_retrieve_tools, ahybrid_retrieve_tools
+from ..core.blob_store import blob_store
+from ..config.settings import settings
 
 
-def retrieve_tools(keywords: str, conversations):
+def _build_query(keywords: str, conversations) -> str:
     # Build a robust context from the most recent messages (up to 5)
     recent = conversations[-5:] if isinstance(conversations, list) else []
     try:
@@ -15,7 +17,28 @@ def retrieve_tools(keywords: str, conversations):
     except Exception:
         context = ""
 
-    query = f"{keywords} {context}".strip()
-    return retrieve_semantic_tools(query, "tools", 0.80)
+    return f"{keywords} {context}".strip()
 
 
+def retrieve_tools(keywords: str, conversations, scope=None):
+    query = _build_query(keywords, conversations)
+    return hybrid_retrieve_tools(keywords, query, scope, 0.80)
+
+
+async def aretrieve_tools(keywords: str, conversations, scope=None):
+    query = _build_query(keywords, conversations)
+    return await ahybrid_retrieve_tools(keywords, query, scope, 0.80)
+
+
+def read_blob(blob_id: str, offset: int = 0, length: int = 0, conversations=None):
+    size = blob_store.size(blob_id)
+    if size is None:
+        return f"Blob {blob_id} not found."
+    offset = max(int(offset or 0), 0)
+    length = int(length or 0) or settings.blob_read_bytes
+    length = min(length, settings.blob_read_bytes)
+    data = blob_store.read(blob_id, offset, length)
+    end = offset + len(data)
+    text = data.decode("utf-8", errors="ignore")
+    more = f" next offset is {end}." if end < size else " end of blob."
+    return f"[bytes {offset}-{end} of {size}.{more}]\n{text}"
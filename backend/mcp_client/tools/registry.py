@@ -1,6 +1,8 @@
+import inspect
 from typing import Any, Callable
 
 from . import custom_tools
+from ..utils.executor import run_blocking
 
 
 REGISTRY: dict[str, Callable[..., Any]] = {
@@ -19,4 +21,20 @@ def call(name: str, **kwargs):
     return REGISTRY[name](**kwargs)
 
 
+async def acall(name: str, **kwargs):
+    """
+    calls a tool without blocking the event loop. an async variant
+    named 'a<name>' is preferred, otherwise the tool runs on the thread pool.
+    """
+    if not has(name):
+        raise KeyError(f"Tool '{name}' not found")
+    async_fn = REGISTRY.get(f"a{name}")
+    if async_fn and inspect.iscoroutinefunction(async_fn):
+        return await async_fn(**kwargs)
+    fn = REGISTRY[name]
+    if inspect.iscoroutinefunction(fn):
+        return await fn(**kwargs)
+    return await run_blocking(fn, **kwargs)
+
+
 
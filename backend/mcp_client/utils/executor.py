@@ -0,0 +1,18 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from ..config.settings import settings
+
+
+# bounded pool for blocking work (chroma, sqlite, numpy) called from async code
+_executor = ThreadPoolExecutor(
+    max_workers=settings.blocking_pool_size,
+    thread_name_prefix="mcp-blocking",
+)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """runs a blocking callable on the shared thread pool without stalling the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
@@ -0,0 +1,87 @@
+import json
+from typing import Any, Dict
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder is used without it
+    orjson = None
+
+
+def dumps(message: Dict[str, Any]) -> bytes:
+    """encodes an event as utf-8 JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(message, default=str)
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+class EventSerializer:
+    """
+    encodes outbound websocket events.
+
+    text mode sends JSON text frames, the format Starlette's send_json uses.
+    binary mode sends the encoded bytes as-is, which skips decoding them back
+    into a str for every event. the browser handles both.
+    """
+
+    def __init__(self, binary: bool = False):
+        self.binary = binary
+        self.backend = "orjson" if orjson is not None else "json"
+
+    def encode(self, message: Dict[str, Any]) -> str | bytes:
+        data = dumps(message)
+        return data if self.binary else data.decode("utf-8")
+
+    async def send(self, websocket, message: Dict[str, Any]):
+        data = self.encode(message)
+        if self.binary:
+            await websocket.send_bytes(data)
+        else:
+            await websocket.send_text(data)
+
+
+if __name__ == "__main__":
+    import timeit
+    import zlib
+
+    events = {
+        "text_chunk": {
+            "messageId": "4f1c2a9e-8b7d-4e7a-9c55-1f2e3d4c5b6a",
+            "type": "text_chunk",
+            "partIndex": 3,
+            "text": "the quick brown fox jumps over the lazy dog, ",
+            "status": "Generating resonse ...",
+        },
+        "tool_update": {
+            "type": "tool_update",
+            "messageId": "4f1c2a9e-8b7d-4e7a-9c55-1f2e3d4c5b6a",
+            "partIndex": 2,
+            "version": 3,
+            "set": {"output": "row 1, ok\n" * 800, "state": "output-available"},
+        },
+        "app_part": {
+            "type": "content_part_start",
+            "messageId": "4f1c2a9e-8b7d-4e7a-9c55-1f2e3d4c5b6a",
+            "partIndex": 5,
+            "part": {"app": {"sourceCode": "<div class=\"row\">cell</div>\n" * 2000, "width": "500px", "height": "500px"}},
+        },
+    }
+
+    def starlette_text(message):
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+    modes = {"stdlib text": starlette_text}
+    if orjson is not None:
+        modes["orjson text"] = EventSerializer(binary=False).encode
+        modes["orjson binary"] = EventSerializer(binary=True).encode
+    else:
+        print("orjson is not installed, only the stdlib encoder is measured")
+
+    for name, message in events.items():
+        raw = dumps(message)
+        deflated = zlib.compressobj(wbits=-15)
+        compressed = deflated.compress(raw) + deflated.flush(zlib.Z_SYNC_FLUSH)
+        print(f"{name}: {len(raw)} bytes, {len(compressed)} bytes with permessage-deflate")
+        for mode, encode in modes.items():
+            runs = 20000 if name == "text_chunk" else 500
+            seconds = timeit.timeit(lambda: encode(message), number=runs)
+            print(f"  {mode:14} {1e6 * seconds / runs:8.2f} us/event")
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from mcp_client.rag import compact_store
+from mcp_client.rag.compact_store import CompactVectorStore
+
+
+def vectors(count=60, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = rng.standard_normal((count, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def exact(matrix, query, k):
+    distances = ((matrix - query) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return [f"tool_{i}" for i in order], distances[order]
+
+
+def make_store(root, matrix, **kwargs):
+    names = [f"tool_{i}" for i in range(len(matrix))]
+    store = CompactVectorStore(str(root), dim=8, **kwargs)
+    store.write(names, names, matrix, [""] * len(names), "test")
+    return store
+
+
+@pytest.mark.parametrize("dtype", ["int8", "float16"])
+def test_rerank_returns_exact_nearest_neighbours(tmp_path, dtype):
+    matrix = vectors()
+    # re-ranking every row makes the coarse scores irrelevant to the result
+    store = make_store(tmp_path, matrix, dtype=dtype, rerank_k=len(matrix))
+
+    for query in vectors(count=5, seed=1):
+        names, distances = exact(matrix, query, 10)
+        results = store.query(query, n_results=10)
+
+        assert [name for name, _ in results] == names
+        np.testing.assert_allclose([distance for _, distance in results], distances, rtol=1e-5, atol=1e-5)
+
+
+def test_a_stored_vector_is_its_own_nearest_neighbour(tmp_path):
+    matrix = vectors()
+    store = make_store(tmp_path, matrix, rerank_k=5)
+
+    for i in (0, 17, 59):
+        name, distance = store.query(matrix[i], n_results=1)[0]
+        assert name == f"tool_{i}"
+        assert distance == pytest.approx(0.0, abs=1e-5)
+
+
+def test_mask_limits_results_to_selected_rows(tmp_path):
+    matrix = vectors()
+    store = make_store(tmp_path, matrix)
+    mask = np.zeros(len(matrix), dtype=bool)
+    mask[[3, 9, 40]] = True
+
+    results = store.query(matrix[0], n_results=10, mask=mask)
+
+    assert sorted(name for name, _ in results) == ["tool_3", "tool_40", "tool_9"]
+    assert store.query(matrix[0], mask=np.zeros(len(matrix), dtype=bool)) == []
+
+
+def test_append_adds_only_unknown_ids(tmp_path):
+    matrix = vectors()
+    store = make_store(tmp_path, matrix[:40])
+    names = [f"tool_{i}" for i in range(30, 60)]
+
+    added = store.append(names, names, matrix[30:], [""] * len(names), "test")
+
+    reader = CompactVectorStore(str(tmp_path), dim=8)
+    assert reader.open()
+    assert added == 20
+    assert reader.ids == [f"tool_{i}" for i in range(60)]
+    assert reader.query(matrix[55], n_results=1)[0][0] == "tool_55"
+    with pytest.raises(ValueError):
+        store.append(["other"], ["other"], matrix[:1], [""], "another-backend")
+
+
+def test_block_scoring_matches_a_single_block(tmp_path, monkeypatch):
+    matrix = vectors()
+    store = make_store(tmp_path, matrix, rerank_k=10)
+    query = vectors(count=1, seed=2)[0]
+    whole = store.query(query, n_results=10)
+
+    # blocks that do not divide the row count
+    monkeypatch.setattr(compact_store, "_SCORE_BLOCK", 7)
+
+    assert store.query(query, n_results=10) == whole
@@ -0,0 +1,109 @@
+import asyncio
+import json
+
+import app
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, data):
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    def events(self):
+        return [json.loads(data) for data in self.sent]
+
+
+class FakeOrchestrator:
+    """
+    answers every turn with one message named after its content and records
+    which connection the turn streamed to. turns in `held` wait for `release`
+    after their start.
+    """
+
+    runs = []
+    held = set()
+    release: asyncio.Event
+
+    def __init__(self, manager=None, websocket=None, writer=None, **kwargs):
+        self.manager = manager
+        self.websocket = websocket
+        self.writer = writer
+
+    async def chat_loop(self, message):
+        answer = message["content"]
+        await self.writer.send_json({"type": "start", "messageId": answer})
+        if answer in FakeOrchestrator.held:
+            await FakeOrchestrator.release.wait()
+        await self.writer.send_json({"type": "text_chunk", "messageId": answer, "partIndex": 0, "text": answer})
+        await self.writer.send_json({"type": "end", "messageId": answer})
+        FakeOrchestrator.runs.append((answer, self.manager, self.writer.writer))
+
+
+def _use_fakes(monkeypatch, held):
+    monkeypatch.setattr(app, "ChatOrchestrator", FakeOrchestrator)
+    monkeypatch.setattr(app.settings, "stream_resume_grace_seconds", 60)
+    FakeOrchestrator.runs = []
+    FakeOrchestrator.held = set(held)
+
+
+def test_queued_turns_run_on_the_resuming_connection(monkeypatch):
+    _use_fakes(monkeypatch, {"queued-1"})
+
+    async def scenario():
+        FakeOrchestrator.release = asyncio.Event()
+        dropped = app.ConnectionManager(FakeWebSocket())
+        for content in ("queued-1", "queued-2", "queued-3"):
+            dropped.schedule_turn({"chatId": "chat", "content": content})
+        await asyncio.sleep(0)
+        dropped.disconnect()
+
+        resumed = app.ConnectionManager(FakeWebSocket())
+        await resumed.resume("queued-1", -1)
+        FakeOrchestrator.release.set()
+        await asyncio.gather(*resumed.turn_tasks)
+        return dropped, resumed
+
+    dropped, resumed = asyncio.run(scenario())
+
+    assert [answer for answer, _, _ in FakeOrchestrator.runs] == ["queued-1", "queued-2", "queued-3"]
+    for _, manager, writer in FakeOrchestrator.runs:
+        assert manager is resumed
+        assert writer is resumed.writer
+    assert dropped.current() is resumed
+    assert dropped.orchestrators is resumed.orchestrators
+    assert not resumed.turn_tasks and not resumed.chat_tails
+
+
+def test_adopted_chat_streams_to_the_resuming_connection(monkeypatch):
+    _use_fakes(monkeypatch, {"adopt-a1"})
+
+    async def scenario():
+        FakeOrchestrator.release = asyncio.Event()
+        dropped = app.ConnectionManager(FakeWebSocket())
+        dropped.schedule_turn({"chatId": "b", "content": "adopt-b1"})
+        dropped.schedule_turn({"chatId": "a", "content": "adopt-a1"})
+        await asyncio.sleep(0.01)
+        dropped.disconnect()
+
+        socket = FakeWebSocket()
+        resumed = app.ConnectionManager(socket)
+        # the client saw the start of a1, chat b was adopted but not resumed
+        await resumed.resume("adopt-a1", 0)
+        FakeOrchestrator.release.set()
+        resumed.schedule_turn({"chatId": "b", "content": "adopt-b2"})
+        await asyncio.gather(*resumed.turn_tasks)
+        await resumed.writer.flush()
+        await resumed.writer.close()
+        return socket.events()
+
+    events = asyncio.run(scenario())
+
+    received = [(event["messageId"], event["type"]) for event in events if "messageId" in event]
+    assert ("adopt-a1", "end") in received
+    assert [event for message_id, event in received if message_id == "adopt-b2"] == ["start", "text_chunk", "end"]
+    assert not any(message_id == "adopt-b1" for message_id, _ in received)
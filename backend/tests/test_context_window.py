@@ -0,0 +1,86 @@
+import asyncio
+
+from mcp_client.core.context_window import ContextWindow, estimate_tokens
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    async def complete(self, system, messages, model):
+        self.prompts.append(messages[0]["content"])
+        return "the user asked about the weather"
+
+
+def turn(i, size=40):
+    return [
+        {"role": "user", "content": f"question {i} " + "q" * size},
+        {"role": "assistant", "content": f"answer {i} " + "a" * size},
+    ]
+
+
+def test_earlier_tool_results_are_digested_but_the_current_turn_is_not():
+    window = ContextWindow(FakeLLM(), budget_tokens=100000, tool_result_chars=20)
+    long_result = "x" * 200
+    messages = [
+        {"role": "user", "content": "first"},
+        {"role": "tool", "name": "search", "content": long_result},
+        {"role": "user", "content": "second"},
+        {"role": "tool", "name": "search", "content": long_result},
+    ]
+
+    _, sent = window.build("system", messages)
+
+    assert "omitted" in sent[1]["content"]
+    assert sent[3]["content"] == long_result
+    assert messages[1]["content"] == long_result
+
+
+def test_over_budget_drops_oldest_whole_turns():
+    messages = turn(0) + turn(1) + turn(2)
+    per_turn = sum(map(estimate_tokens, turn(0)))
+    budget = estimate_tokens({"content": "system"}) + 2 * per_turn + 1
+    window = ContextWindow(FakeLLM(), budget_tokens=budget)
+
+    _, sent = window.build("system", messages)
+
+    assert sent == messages[2:]
+
+
+def test_the_current_turn_is_kept_even_over_budget():
+    messages = turn(0) + turn(1, size=4000)
+    window = ContextWindow(FakeLLM(), budget_tokens=50)
+
+    _, sent = window.build("system", messages)
+
+    assert sent == messages[2:]
+
+
+def test_summary_replaces_the_turns_before_its_boundary():
+    llm = FakeLLM()
+    window = ContextWindow(llm, budget_tokens=200, summarize_ratio=0.5)
+    messages = turn(0) + turn(1) + turn(2) + turn(3)
+
+    async def scenario():
+        window.schedule_summary(messages)
+        await window._task
+
+    asyncio.run(scenario())
+
+    assert window._boundary is not None and messages[window._boundary]["role"] == "user"
+    _, sent = window.build("system", messages)
+    assert sent[0]["content"].endswith("the user asked about the weather")
+    assert sent[1:] == messages[window._boundary:]
+    assert "question 0" in llm.prompts[0]
+
+
+def test_summary_boundary_is_located_by_seq_after_a_trim():
+    window = ContextWindow(FakeLLM(), budget_tokens=100000)
+    window.summary = "earlier"
+    # messages 0-3 were summarized, the window was trimmed to start at seq 2
+    window._boundary = 4
+    messages = (turn(0) + turn(1) + turn(2) + turn(3))[2:]
+
+    _, sent = window.build("system", messages, first_seq=2)
+
+    assert sent[1:] == messages[2:]
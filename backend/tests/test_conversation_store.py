@@ -0,0 +1,99 @@
+import asyncio
+import sqlite3
+
+from mcp_client.core.conversation_store import ConversationStore
+
+
+def user(i):
+    return {"role": "user", "content": f"question {i}"}
+
+
+def assistant(i):
+    return {"role": "assistant", "content": f"answer {i}"}
+
+
+def tool(i):
+    return {"role": "tool", "name": "search", "content": f"result {i}"}
+
+
+def seqs(path, chat_id):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[0] for row in conn.execute("SELECT seq FROM messages WHERE chat_id = ? ORDER BY seq", (chat_id,))]
+    finally:
+        conn.close()
+
+
+def test_trim_only_cuts_in_front_of_a_user_message(tmp_path):
+    store = ConversationStore(str(tmp_path / "chats.db"), window_size=3)
+    window = store.load("c1")
+    for message in (user(0), tool(0), assistant(0), user(1), tool(1)):
+        store.append("c1", message, window)
+
+    # cutting to 3 would start on a tool message, the cut moves up to user 1
+    assert window == [user(1), tool(1)]
+
+
+def test_seq_continues_across_reload_and_eviction(tmp_path):
+    path = str(tmp_path / "chats.db")
+    store = ConversationStore(path, max_chats=1)
+    store.append("c1", user(0), store.load("c1"))
+    store.append("c1", assistant(0))
+    # loading another chat evicts c1
+    store.load("c2")
+    store.append("c1", user(1))
+
+    reopened = ConversationStore(path)
+    reopened.append("c1", assistant(1), reopened.load("c1"))
+
+    assert seqs(path, "c1") == [0, 1, 2, 3]
+    assert reopened.load("c1") == [user(0), assistant(0), user(1), assistant(1)]
+
+
+def test_concurrent_appends_after_eviction_get_distinct_seqs(tmp_path):
+    path = str(tmp_path / "chats.db")
+    store = ConversationStore(path, max_chats=1)
+
+    async def scenario():
+        window = await store.aload("c1")
+        await store.aappend("c1", user(0), window)
+        await store.aload("c2")
+        await asyncio.gather(*(store.aappend("c1", assistant(i), window) for i in range(5)))
+
+    asyncio.run(scenario())
+
+    assert seqs(path, "c1") == list(range(6))
+
+
+def test_load_reaches_back_to_the_user_message_of_a_long_tool_exchange(tmp_path):
+    path = str(tmp_path / "chats.db")
+    writer = ConversationStore(path)
+    window = writer.load("c1")
+    for message in (user(0), assistant(0), user(1), tool(1), tool(2), tool(3)):
+        writer.append("c1", message, window)
+
+    window = ConversationStore(path, window_size=2).load("c1")
+
+    assert window == [user(1), tool(1), tool(2), tool(3)]
+
+
+def test_first_seq_of_a_trimmed_window(tmp_path):
+    path = str(tmp_path / "chats.db")
+    writer = ConversationStore(path)
+    window = writer.load("c1")
+    for message in (user(0), assistant(0), user(1), assistant(1), user(2)):
+        writer.append("c1", message, window)
+
+    store = ConversationStore(path, window_size=3, max_chats=1)
+
+    async def scenario():
+        window = await store.aload("c1")
+        first = await store.afirst_seq("c1", window)
+        # evicted chats read their last seq back from disk
+        await store.aload("c2")
+        return window, first, await store.afirst_seq("c1", window)
+
+    window, first, after_eviction = asyncio.run(scenario())
+
+    assert window == [user(1), assistant(1), user(2)]
+    assert first == after_eviction == 2
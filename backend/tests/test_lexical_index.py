@@ -0,0 +1,50 @@
+from mcp_client.rag.lexical_index import LexicalIndex
+
+
+def make_index(names):
+    index = LexicalIndex()
+    index.replace(names, [f"Tool: {name}" for name in names])
+    return index
+
+
+def test_exact_names_in_any_separator_style():
+    index = make_index(["web_search", "calculator", "get_weather", "send_email"])
+
+    assert index.match_names("web_search, calculator, get_weather") == (["web_search", "calculator", "get_weather"], True)
+    assert index.match_names("web_search calculator get_weather") == (["web_search", "calculator", "get_weather"], True)
+    assert index.match_names("send-email") == (["send_email"], True)
+
+
+def test_single_words_match_name_parts():
+    index = make_index(["get_weather", "get_forecast", "send_email"])
+
+    assert index.match_names("weather") == (["get_weather"], True)
+    assert index.match_names("get weather") == (["get_weather"], True)
+    assert index.match_names("weather banana") == (["get_weather"], False)
+
+
+def test_typos_match_by_trigram_similarity():
+    index = make_index(["calculator", "get_weather"])
+
+    assert index.match_name("calculater") is None
+    assert index.match_name("calculater", min_similarity=0.5) == "calculator"
+
+
+def test_federated_names_match_without_their_server_prefix():
+    index = make_index(["axon__get_weather", "axon__web_search", "other__web_search"])
+
+    assert index.match_names("get_weather") == (["axon__get_weather"], True)
+    assert index.match_names("axon__get_weather") == (["axon__get_weather"], True)
+    # a bare name shared by two servers resolves to both
+    assert index.match_names("web_search") == (["axon__web_search", "other__web_search"], True)
+    assert index.match_names("axon") == ([], False)
+
+
+def test_search_ranks_by_bm25():
+    index = LexicalIndex()
+    index.replace(
+        ["get_weather", "send_email"],
+        ["current weather and temperature for a city", "send an email message to a recipient"],
+    )
+
+    assert [name for name, _ in index.search("weather in a city")][0] == "get_weather"
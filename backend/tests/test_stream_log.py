@@ -0,0 +1,68 @@
+import asyncio
+
+from mcp_client.core.stream_log import MessageLog, StreamChannel, StreamRegistry
+
+
+class FakeWriter:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+
+def chunk(text, part=0):
+    return {"type": "text_chunk", "messageId": "m1", "partIndex": part, "text": text}
+
+
+def test_merged_chunks_resume_from_the_middle_of_the_run():
+    log = MessageLog(channel=None)
+    log.append({"type": "start", "messageId": "m1"})
+    for text in ("hel", "lo ", "wor", "ld"):
+        log.append(chunk(text))
+
+    assert len(log) == 2
+    # seq 2 is the end of "hello "
+    assert log.after(2) == [{**chunk("world"), "seq": 4}]
+    assert log.after(0) == [{**chunk("hello world"), "seq": 4}]
+    assert log.after(4) == []
+
+
+def test_a_new_part_starts_a_new_entry():
+    log = MessageLog(channel=None)
+    log.append(chunk("a"))
+    log.append(chunk("b", part=1))
+    log.append(chunk("c", part=1))
+
+    assert log.after(0) == [{**chunk("bc", part=1), "seq": 2}]
+    assert log.after(1) == [{**chunk("c", part=1), "seq": 2}]
+
+
+def test_evicted_history_cannot_be_replayed():
+    log = MessageLog(channel=None, max_entries=2)
+    log.append({"type": "start", "messageId": "m1"})
+    log.append(chunk("a"))
+    log.append({"type": "end", "messageId": "m1"})
+
+    assert log.after(-1) is None
+    assert [event["seq"] for event in log.after(0)] == [1, 2]
+
+
+def test_resume_follows_the_turn_into_its_next_message():
+    async def scenario():
+        registry = StreamRegistry()
+        channel = StreamChannel(FakeWriter(), registry)
+        await channel.send_json({"type": "start", "messageId": "m1"})
+        await channel.send_json({"type": "end", "messageId": "m1", "next": "m2"})
+        await channel.send_json({"type": "start", "messageId": "m2"})
+
+        writer = FakeWriter()
+        resumed = await registry.resume("m1", 0, writer)
+        await channel.send_json({"type": "end", "messageId": "m2"})
+        return resumed, writer.sent, channel
+
+    resumed, sent, channel = asyncio.run(scenario())
+
+    assert resumed
+    assert [(event["messageId"], event["type"]) for event in sent] == [("m1", "end"), ("m2", "start"), ("m2", "end")]
+    assert channel.streaming is None
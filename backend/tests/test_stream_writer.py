@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+from mcp_client.core.stream_writer import StreamWriter
+
+
+class FakeWebSocket:
+    """collects sent frames, sends wait while `gate` is cleared."""
+
+    def __init__(self):
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def send_text(self, data):
+        await self.gate.wait()
+        self.sent.append(json.loads(data))
+
+
+def chunk(text, part=0, message="m1"):
+    return {"type": "text_chunk", "messageId": message, "partIndex": part, "text": text}
+
+
+def test_text_chunks_of_one_part_go_out_as_one_frame():
+    async def scenario():
+        websocket = FakeWebSocket()
+        writer = StreamWriter(websocket, flush_interval_ms=50)
+        for text in ("hel", "lo ", "world"):
+            await writer.send_json(chunk(text))
+        await writer.flush()
+        await writer.close()
+        return websocket.sent, writer
+
+    sent, writer = asyncio.run(scenario())
+
+    assert sent == [chunk("hello world")]
+    assert writer.merged == 2
+
+
+def test_other_events_flush_pending_text_first():
+    async def scenario():
+        websocket = FakeWebSocket()
+        writer = StreamWriter(websocket, flush_interval_ms=1000)
+        await writer.send_json(chunk("a"))
+        await writer.send_json(chunk("b"))
+        await writer.send_json(chunk("c", part=1))
+        await writer.send_json({"type": "end", "messageId": "m1"})
+        await writer.flush()
+        await writer.close()
+        return websocket.sent
+
+    sent = asyncio.run(scenario())
+
+    assert sent == [chunk("ab"), chunk("c", part=1), {"type": "end", "messageId": "m1"}]
+
+
+def test_caller_chunks_are_not_mutated_by_merging():
+    async def scenario():
+        writer = StreamWriter(FakeWebSocket(), flush_interval_ms=1000)
+        first = chunk("a")
+        await writer.send_json(first)
+        await writer.send_json(chunk("b"))
+        await writer.close()
+        return first
+
+    assert asyncio.run(scenario()) == chunk("a")
+
+
+def test_full_queue_drops_new_status_messages():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = StreamWriter(websocket, max_queue=2)
+        await writer.send_json({"type": "start", "messageId": "m1"})
+        # the writer task takes the start and waits on the socket
+        await asyncio.sleep(0)
+        await writer.send_json({"type": "tool_update", "messageId": "m1", "version": 1})
+        await writer.send_json({"type": "tool_update", "messageId": "m1", "version": 2})
+        await writer.send_json({"type": "log", "messageId": "m1", "status": "working"})
+        websocket.gate.set()
+        await writer.flush()
+        await writer.close()
+        return websocket.sent, writer
+
+    sent, writer = asyncio.run(scenario())
+
+    assert [event["type"] for event in sent] == ["start", "tool_update", "tool_update"]
+    assert writer.dropped == 1
+
+
+def test_queued_status_messages_make_room_for_newer_events():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = StreamWriter(websocket, max_queue=2)
+        await writer.send_json({"type": "start", "messageId": "m1"})
+        await asyncio.sleep(0)
+        await writer.send_json({"type": "log", "messageId": "m1", "status": "working"})
+        await writer.send_json({"type": "tool_update", "messageId": "m1", "version": 1})
+        await writer.send_json({"type": "end", "messageId": "m1"})
+        websocket.gate.set()
+        await writer.flush()
+        await writer.close()
+        return websocket.sent, writer
+
+    sent, writer = asyncio.run(scenario())
+
+    assert [event["type"] for event in sent] == ["start", "tool_update", "end"]
+    assert writer.dropped == 1
+    assert writer.backpressure_waits == 0
+
+
+def test_full_queue_of_events_makes_the_sender_wait():
+    async def scenario():
+        websocket = FakeWebSocket()
+        websocket.gate.clear()
+        writer = StreamWriter(websocket, max_queue=2)
+        await writer.send_json({"type": "start", "messageId": "m1"})
+        await asyncio.sleep(0)
+        await writer.send_json({"type": "tool_update", "messageId": "m1", "version": 1})
+        await writer.send_json({"type": "tool_update", "messageId": "m1", "version": 2})
+
+        blocked = asyncio.create_task(writer.send_json({"type": "end", "messageId": "m1"}))
+        await asyncio.sleep(0.01)
+        waiting = not blocked.done()
+        websocket.gate.set()
+        await blocked
+        await writer.flush()
+        await writer.close()
+        return websocket.sent, writer, waiting
+
+    sent, writer, waiting = asyncio.run(scenario())
+
+    assert waiting
+    assert writer.backpressure_waits == 1
+    assert [event["type"] for event in sent] == ["start", "tool_update", "tool_update", "end"]
+    assert writer.dropped == 0
@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+from mcp_client.core.tool_stream import ToolCallAssembler
+
+
+def delta(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def kinds(events):
+    return [(event, key) for event, key, _ in events]
+
+
+def test_call_completes_once_its_arguments_parse():
+    assembler = ToolCallAssembler()
+
+    events = assembler.feed([delta(0, id="call_1", name="get_weather", arguments='{"city": ')])
+    assert kinds(events) == [("new", 0)]
+
+    events = assembler.feed([delta(0, arguments='"Paris"}')])
+
+    assert kinds(events) == [("arguments", 0), ("complete", 0)]
+    call = events[-1][2]
+    assert call == {"id": "call_1", "name": "get_weather", "arguments": '{"city": "Paris"}'}
+    assert assembler.finish() == []
+
+
+def test_new_index_releases_the_previous_call():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, id="call_1", name="search", arguments='{"q": "un')])
+
+    events = assembler.feed([delta(1, id="call_2", name="calculator", arguments="{}")])
+
+    assert kinds(events) == [("complete", 0), ("new", 1), ("complete", 1)]
+    # released calls are dispatched with whatever arguments they got
+    assert events[0][2]["arguments"] == '{"q": "un'
+
+
+def test_finish_releases_calls_that_never_parsed_and_fills_in_an_id():
+    assembler = ToolCallAssembler()
+    assembler.feed([delta(0, name="search", arguments="not json")])
+
+    events = assembler.finish()
+
+    assert kinds(events) == [("complete", 0)]
+    assert events[0][2]["id"]
+    assert assembler.finish() == []
+
+
+def test_index_less_deltas_are_separate_calls():
+    assembler = ToolCallAssembler()
+
+    events = assembler.feed([
+        delta(None, id="call_1", name="get_weather", arguments='{"city": "Paris"}'),
+        delta(None, id="call_2", name="get_time", arguments='{"zone": "CET"}'),
+    ])
+
+    assert [event for event, _, _ in events] == ["new", "complete", "new", "complete"]
+    assert [call["name"] for event, _, call in events if event == "complete"] == ["get_weather", "get_time"]
+    assert events[0][1] != events[2][1]
@@ -0,0 +1,49 @@
+from mcp_client.core.tool_updates import ToolUpdateEncoder
+
+PART_MESSAGE = {"type": "content_part_start", "chatId": "c1", "messageId": "m1", "partIndex": 0, "part": {"text": ""}}
+
+
+def tool(**fields):
+    return {"id": "call_1", "name": "search", "input": "", "state": "input-streaming", **fields}
+
+
+def test_first_state_is_a_full_part_at_version_0():
+    encoder = ToolUpdateEncoder()
+
+    event = encoder.encode(PART_MESSAGE, 1, tool())
+
+    assert event == {**PART_MESSAGE, "partIndex": 1, "version": 0, "part": {"tool": tool()}}
+
+
+def test_later_states_are_deltas_with_increasing_versions():
+    encoder = ToolUpdateEncoder()
+    encoder.encode(PART_MESSAGE, 0, tool())
+
+    grown = encoder.encode(PART_MESSAGE, 0, tool(input='{"q": '))
+    more = encoder.encode(PART_MESSAGE, 0, tool(input='{"q": "paris"}'))
+    done = encoder.encode(PART_MESSAGE, 0, tool(input='{"q": "paris"}', state="output-available", output="sunny"))
+
+    base = {"type": "tool_update", "messageId": "m1", "partIndex": 0}
+    # the empty input is replaced, not appended to
+    assert grown == {**base, "version": 1, "set": {"input": '{"q": '}}
+    assert more == {**base, "version": 2, "append": {"input": '"paris"}'}}
+    assert done == {**base, "version": 3, "set": {"state": "output-available", "output": "sunny"}}
+
+
+def test_unchanged_state_encodes_to_none():
+    encoder = ToolUpdateEncoder()
+    encoder.encode(PART_MESSAGE, 0, tool(input="{}"))
+
+    assert encoder.encode(PART_MESSAGE, 0, tool(input="{}")) is None
+
+
+def test_parts_are_versioned_separately_and_reset_starts_over():
+    encoder = ToolUpdateEncoder()
+    encoder.encode(PART_MESSAGE, 0, tool())
+    encoder.encode(PART_MESSAGE, 0, tool(input="{}"))
+
+    assert encoder.encode(PART_MESSAGE, 1, tool())["version"] == 0
+
+    encoder.reset()
+    event = encoder.encode(PART_MESSAGE, 0, tool(input="{}"))
+    assert event["type"] == "content_part_start" and event["version"] == 0
@@ -15,6 +15,8 @@ import {
 } from '@/components/ui/collapsible';
 import { cn } from '@/lib/utils';
 import { CodeBlock } from './code-block';
+import { useRef, useState } from 'react';
+import { fetchBlobPage } from '@/services/blobService';
 
 export const Tool = ({
   className,
@@ -99,12 +101,35 @@ export const ToolOutput = ({
   className,
   output,
   errorText,
+  blob,
   ...props
 }) => {
+  // output holds a preview when the full result lives in the blob store
+  const [full, setFull] = useState(null);
+  const [nextOffset, setNextOffset] = useState(0);
+  const [loading, setLoading] = useState(false);
+  const decoder = useRef(null);
+
   if (!(output || errorText)) {
     return null;
   }
 
+  const loadMore = async () => {
+    setLoading(true);
+    try {
+      const page = await fetchBlobPage(blob, nextOffset);
+      // pages are byte ranges, a streaming decoder keeps characters split across them intact
+      decoder.current ??= new TextDecoder();
+      const text = decoder.current.decode(page.bytes, { stream: page.nextOffset < blob.size });
+      setFull((full ?? '') + text);
+      setNextOffset(page.nextOffset);
+    } catch (error) {
+      console.error('Failed to load tool result:', error);
+    } finally {
+      setLoading(false);
+    }
+  };
+
   return (
     <div className={cn('space-y-2 p-4', className)} {...props}>
       <h4
@@ -116,8 +141,17 @@ export const ToolOutput = ({
           ? 'bg-destructive/10 text-destructive'
           : 'bg-muted/50 text-foreground')}>
         {errorText && <div>{errorText}</div>}
-        {output && <div>{output}</div>}
+        {output && <div>{full ?? output}</div>}
       </div>
+      {blob && nextOffset < blob.size && (
+        <button
+          type="button"
+          className="text-muted-foreground text-xs underline"
+          disabled={loading}
+          onClick={loadMore}>
+          {loading ? 'Loading ...' : full == null ? 'Load full result' : 'Load more'}
+        </button>
+      )}
     </div>
   );
 };
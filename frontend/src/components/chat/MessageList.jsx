@@ -90,7 +90,7 @@ function MessageList({ messages, loadingState}) {
           <ToolHeader type={toolType} state={toolState} />
           <ToolContent>
             {toolInput != null && <ToolInput input={toolInput} />}
-            <ToolOutput output={toolOutput} errorText={toolError} />
+            <ToolOutput output={toolOutput} errorText={toolError} blob={tool.blob} />
           </ToolContent>
         </Tool>
       )
@@ -23,6 +23,9 @@ export function ChatProvider({ children }) {
 
   const [folders, setFolders] = useState([])
   const streamingMessageIdRef = useRef(null);
+  // last seq applied per message and the answers still streaming, used to resume after a reconnect
+  const lastSeqRef = useRef(new Map());
+  const inflightRef = useRef(new Set());
   const [loadingState, setLoadingState] = useState({
     isActive: false,
     message: ''
@@ -31,9 +34,19 @@ export function ChatProvider({ children }) {
 
     console.log("new message - reconnecting")
     websocketService.connect();
-    const socket = websocketService.getSocket();
     const handleSocketMessage = (event) => {
-      const data = JSON.parse(event.data);
+      const data = websocketService.parse(event.data);
+
+      // events are numbered per message, replays after a resume may overlap what we already have
+      if (data.messageId && data.seq != null) {
+        const lastSeq = lastSeqRef.current.get(data.messageId);
+        if (lastSeq != null && data.seq <= lastSeq) return;
+        lastSeqRef.current.set(data.messageId, data.seq);
+      }
+      if (data.type === 'start') inflightRef.current.add(data.messageId);
+      if (data.type === 'end' || data.type === 'resume_failed') inflightRef.current.delete(data.messageId);
+      // a tool round ended this message, the answer goes on under the next one
+      if (data.type === 'end' && data.next) inflightRef.current.add(data.next);
 
       setMessagesByConversation(prev => {
         const activeMessages = prev[activeConversationId] || [];
@@ -45,7 +58,7 @@ export function ChatProvider({ children }) {
         if (data.status) {
             setLoadingState(prev => ({ ...prev, message: data.status }));
           }
-        if (data.type === 'end') {
+        if (data.type === 'end' || data.type === 'resume_failed') {
             setLoadingState({ isActive: false, message: '' });
           }
         switch (data.type) {
@@ -62,7 +75,8 @@ export function ChatProvider({ children }) {
             const updatedMessage = { ...newMessages[streamingMessageIndex] };
             const newContent = [...updatedMessage.content];
             const partIndex = data.partIndex;
-            const newPart = data.part;
+            // tool parts carry a version so later tool_update events apply in order
+            const newPart = data.version != null ? { ...data.part, version: data.version } : data.part;
 
             // Check if a part already exists at this index.
             if (newContent[partIndex]) {
@@ -107,9 +121,34 @@ export function ChatProvider({ children }) {
             break;
           }
 
+          // Only the changed fields of a tool part: 'set' replaces, 'append' extends strings
+          case 'tool_update': {
+            const updatedMessage = { ...newMessages[streamingMessageIndex] };
+            const partIndex = data.partIndex;
+            const targetPart = updatedMessage.content[partIndex];
+
+            if (targetPart?.tool && data.version > (targetPart.version ?? -1)) {
+                const newContent = [...updatedMessage.content];
+                const tool = { ...targetPart.tool, ...(data.set || {}) };
+                for (const [field, text] of Object.entries(data.append || {})) {
+                    tool[field] = (tool[field] ?? '') + text;
+                }
+
+                newContent[partIndex] = { ...targetPart, tool, version: data.version };
+                updatedMessage.content = newContent;
+                newMessages[streamingMessageIndex] = updatedMessage;
+            }
+            break;
+          }
+
           case 'end':
             break;
 
+          // The backend could not replay this answer, keep what was received
+          case 'resume_failed':
+            console.warn('Could not resume message:', data.messageId);
+            break;
+
           default:
             console.warn('Received unknown message type:', data.type);
         }
@@ -121,14 +160,24 @@ export function ChatProvider({ children }) {
       });
     };
 
-    if (socket) {
-      socket.addEventListener('message', handleSocketMessage);
-    }
+    // after a reconnect, ask for whatever was missed of the answers still streaming
+    const handleOpen = ({ reconnected }) => {
+      if (!reconnected) return;
+      for (const messageId of inflightRef.current) {
+        websocketService.send(JSON.stringify({
+          type: 'resume',
+          messageId,
+          lastSeq: lastSeqRef.current.get(messageId) ?? -1,
+        }));
+      }
+    };
+
+    const removeMessageListener = websocketService.addMessageListener(handleSocketMessage);
+    const removeOpenListener = websocketService.addOpenListener(handleOpen);
 
     return () => {
-      if (socket) {
-        socket.removeEventListener('message', handleSocketMessage);
-      }
+      removeMessageListener();
+      removeOpenListener();
     };
   }, [activeConversationId]);
 
@@ -17,4 +17,8 @@ export async function postJson(url, body, options = {}) {
   return res.json()
 }
 
-
+export async function getBytesRange(url, start, end, options = {}) {
+  const res = await fetch(url, { ...options, headers: { Range: `bytes=${start}-${end}`, ...(options.headers || {}) } })
+  if (!res.ok) throw new Error(`GET ${url} failed: ${res.status}`)
+  return new Uint8Array(await res.arrayBuffer())
+}
@@ -0,0 +1,11 @@
+// Large tool results are stored on the backend and fetched here page by page
+import { getBytesRange } from './apiClient'
+
+const API_URL = 'http://127.0.0.1:8000';
+const PAGE_BYTES = 64 * 1024;
+
+export async function fetchBlobPage(blob, offset = 0) {
+  const end = Math.min(offset + PAGE_BYTES, blob.size) - 1;
+  const bytes = await getBytesRange(`${API_URL}${blob.url}`, offset, end);
+  return { bytes, nextOffset: end + 1 };
+}
@@ -7,24 +7,38 @@ class WebSocketService {
       return WebSocketService.instance;
     }
     this.socket = null;
+    // listeners survive reconnects, they are attached to every new socket
+    this.messageListeners = new Set();
+    this.openListeners = new Set();
+    this.hasConnected = false;
     WebSocketService.instance = this;
   }
 
   connect() {
-    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+    if (this.socket && this.socket.readyState <= WebSocket.OPEN) {
       console.log('WebSocket is already connected.');
       return;
     }
-    this.socket = new WebSocket(WS_URL);
+    const socket = new WebSocket(WS_URL);
+    this.socket = socket;
+    // the backend may send events as binary frames of UTF-8 JSON
+    socket.binaryType = 'arraybuffer';
+    for (const listener of this.messageListeners) {
+      socket.addEventListener('message', listener);
+    }
 
-    this.socket.onopen = () => {
+    socket.onopen = () => {
       console.log('WebSocket connected');
+      const reconnected = this.hasConnected;
+      this.hasConnected = true;
+      for (const listener of this.openListeners) listener({ reconnected });
     };
 
-    this.socket.onclose = () => {
+    socket.onclose = () => {
       console.log('WebSocket disconnected');
-      // Optional: implement automatic reconnection logic here
-      this.socket = null;
+      if (this.socket === socket) this.socket = null;
+      // the backend keeps generating for a while, reconnect and resume
+      if (this.hasConnected) setTimeout(() => this.connect(), 1000);
     };
 
     this.socket.onerror = (error) => {
@@ -49,6 +63,27 @@ class WebSocketService {
   getSocket() {
     return this.socket;
   }
+
+  addMessageListener(listener) {
+    this.messageListeners.add(listener);
+    this.socket?.addEventListener('message', listener);
+    return () => {
+      this.messageListeners.delete(listener);
+      this.socket?.removeEventListener('message', listener);
+    };
+  }
+
+  addOpenListener(listener) {
+    this.openListeners.add(listener);
+    return () => this.openListeners.delete(listener);
+  }
+
+  // Parses an event from either a text or a binary frame
+  parse(data) {
+    if (typeof data === 'string') return JSON.parse(data);
+    this.decoder ??= new TextDecoder();
+    return JSON.parse(this.decoder.decode(data));
+  }
 }
 
 // Export a single instance